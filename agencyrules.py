@@ -0,0 +1,61 @@
+"""Bike lane fields and translation rules of each agency's data. Does not require arcpy."""
+from translation import AllOf, AnyOf, Assign, Concat, Constant, Equals, Field, IsEmpty, MapCodes, NotEmpty, Translator
+
+# Salt Lake County
+slCountyBikeLaneFields = ['BIKE_L_EXI',
+                          'BIKE_L_PRO',
+                          'BIKE_R_EXI',
+                          'BIKE_R_PRO',
+                          'REGIONAL_P',
+                          'BIKE_NOTES']
+slCountyTranslationFields = [(f, 'TEXT', 50) for f in ['BIKE_R', 'BIKE_L', 'RD_BIKE_NOTES', 'BIKE_STATUS']]
+
+# Wasatch Front Regional Council
+wfrcTypeCodes = {
+    'bike lane': '2C',
+    'shared use path': '2C',
+    'shared lane': '3B',
+    'locally identified corridor': '3C',
+    'shoulder bikeway': '2C',
+    'category 1': '1',
+    'category 3': '3',
+    'grade separated bike lane': '1A',
+    'unknown': '2C',
+    '': '2C'
+}
+wfrcStatusCodes = {
+    'proprosed': 'P',
+    'existing': 'E'
+}
+wfrcBikeLaneFields = ['Type', 'Stat_2015']
+wfrcTranslationFields = [('BikeTypeCode', 'TEXT', 5)]
+
+
+def slCountyTranslator():
+    """Rules that translate Salt Lake County bike fields to CVDomain_OnStreetBike codes."""
+    proposed = AnyOf(NotEmpty('BIKE_L_PRO'), NotEmpty('BIKE_R_PRO'))
+    return Translator([
+        # Proposed lanes
+        Assign('BIKE_L', Field('BIKE_L_PRO'), when=proposed),
+        Assign('BIKE_R', Field('BIKE_R_PRO'), when=proposed),
+        Assign('RD_BIKE_NOTES',
+               Concat(['BIKE_L_PRO', 'BIKE_R_PRO', 'REGIONAL_P', 'BIKE_NOTES'], '|', length=50),
+               when=proposed),
+        Assign('BIKE_STATUS', Constant('P'), when=proposed),
+        Assign('BIKE_STATUS', Constant(None), when=AllOf(proposed, Equals('REGIONAL_P', 'Y'))),
+        # Existing lanes take precedence over proposed lanes
+        Assign('BIKE_L', Field('BIKE_L_EXI'), when=NotEmpty('BIKE_L_EXI')),
+        Assign('BIKE_STATUS', Constant('E'), when=NotEmpty('BIKE_L_EXI')),
+        Assign('RD_BIKE_NOTES', Field('BIKE_NOTES', length=50),
+               when=AllOf(NotEmpty('BIKE_L_EXI'), IsEmpty('RD_BIKE_NOTES'))),
+        Assign('BIKE_R', Field('BIKE_R_EXI'), when=NotEmpty('BIKE_R_EXI')),
+        Assign('BIKE_STATUS', Constant('E'), when=NotEmpty('BIKE_R_EXI')),
+        Assign('RD_BIKE_NOTES', Field('BIKE_NOTES', length=50),
+               when=AllOf(NotEmpty('BIKE_R_EXI'), IsEmpty('RD_BIKE_NOTES')))
+    ], [f[0] for f in slCountyTranslationFields])
+
+
+def wfrcTranslator(typeField='Type', typeCodes=wfrcTypeCodes, statusField='Stat_2015', statusCodes=wfrcStatusCodes):
+    """Rules that translate WFRC bike fields to CVDomain_OnStreetBike codes."""
+    return Translator([MapCodes(typeField, 'BikeTypeCode', typeCodes),
+                       MapCodes(statusField, statusField, statusCodes)])
@@ -0,0 +1,70 @@
+"""Run every agency's bike lanes against the statewide roads in one pass.
+- Writes a LineCoverage table with translated bike fields for each agency."""
+from agencyrules import (slCountyBikeLaneFields, slCountyTranslationFields, slCountyTranslator, wfrcBikeLaneFields,
+                         wfrcTranslationFields, wfrcTranslator)
+from configs import Configs
+from instrumentation import instrumented, recordRows
+from bikelanes_to_roads import *
+from time import time
+
+
+class Agency(object):
+    """Bike lane source for one agency and how its fields are translated."""
+
+    def __init__(self, name, bikeLanes, bikeLaneFields, translator, translationFields):
+        """constructor."""
+        self.name = name
+        self.bikeLanes = bikeLanes
+        self.bikeLaneFields = bikeLaneFields
+        self.translator = translator
+        self.translationFields = translationFields  # (name, type, length) for translator outputs
+
+
+@instrumented('agencies')
+def createAgencyCoverageTables(roadsPath, agencies, distFromBikeLanes, sampleCount=3, exact=False):
+    """Select roads and find the nearest bike lane of every agency in one pass, then write a table per agency.
+
+    Returns {agency name: coverage table}."""
+    for agency in agencies:
+        checkSpatialReferences(roadsPath, agency.bikeLanes.path)
+    preprocessed = readRoadPreprocessing(roadsPath, sampleCount, distFromBikeLanes)
+    coverages = preprocessed.groupCoverageArrays([readLineArrays(a.bikeLanes.path) for a in agencies],
+                                                 distFromBikeLanes,
+                                                 exact)
+    recordRows(rowsIn=len(preprocessed.roads), rowsOut=sum(len(c) for c in coverages))
+
+    coverageTables = {}
+    for agency, coverage in zip(agencies, coverages):
+        coverageTime = time()
+        coverageTables[agency.name] = createJoinedCoverageTable(iterCoverageArrayRows(coverage),
+                                                                agency.bikeLanes,
+                                                                agency.bikeLaneFields,
+                                                                agency.translator,
+                                                                agency.translationFields,
+                                                                'LineCoverage_{}_{}'.format(agency.name,
+                                                                                            Configs.uniqueRunNum))
+        print 'Created {} coverage table: {}'.format(agency.name, round(time() - coverageTime, 3))
+    return coverageTables
+
+
+if __name__ == '__main__':
+    dataDirectory = r'.\data'
+    Configs.setupWorkspace(dataDirectory)
+    totalTime = time()
+    # User provided feature classes.
+    fullSgidRoads = Feature(r'Database Connections\Connection to utrans.agrc.utah.gov.sde\UTRANS.TRANSADMIN.Centerlines_Edit',
+                            'UTRANS.TRANSADMIN.StatewideStreets')
+    distFromBikeLanes = 12  # distance to limit the road layer. Chosen after exploratory analysis.
+    agencies = [Agency('SLCounty',
+                       Feature(Configs.dataGdb, 'SLCountyBikeUpdate'),
+                       slCountyBikeLaneFields,
+                       slCountyTranslator(),
+                       slCountyTranslationFields),
+                Agency('WFRC',
+                       Feature(Configs.dataGdb, 'WFRC_BikeLanes'),
+                       wfrcBikeLaneFields,
+                       wfrcTranslator(),
+                       wfrcTranslationFields)]
+    createAgencyCoverageTables(fullSgidRoads.path, agencies, distFromBikeLanes)
+
+    print 'Completed: {}'.format(round(time() - totalTime, 3))
@@ -0,0 +1,109 @@
+"""Time each coverage pipeline stage on seeded synthetic networks. Does not require arcpy.
+
+usage: python benchmark.py --network grid organic --segments 1000 10000 100000 --output bench.jsonl
+"""
+from __future__ import print_function
+import argparse
+import json
+import numpy as np
+import sys
+from agencyrules import slCountyBikeLaneFields, slCountyTranslator, wfrcBikeLaneFields, wfrcTranslator
+from coverage import coverageArrays, iterCoverageArrayRows
+from nearest import SegmentIndex
+from synthetic import slCountyAttributes, syntheticNetwork
+from time import time
+from translation import Translator, iterJoinedRows
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+
+def measure(stage, results, function, *args):
+    """Run one stage and record its wall time and peak memory."""
+    if tracemalloc is not None:
+        tracemalloc.start()
+    startTime = time()
+    result = function(*args)
+    seconds = time() - startTime
+    if tracemalloc is not None:
+        peakBytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        peakBytes = None
+    results.append({'stage': stage,
+                    'seconds': round(seconds, 4),
+                    'peakBytes': peakBytes,
+                    'maxRssKb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None})
+    return result
+
+
+def runBenchmark(network, segmentCount, seed=0, distFromBikeLanes=12.0, sampleCount=3):
+    """Get a list of stage results for one synthetic network."""
+    roads, lanes, laneAttributes = syntheticNetwork(network, segmentCount, seed)
+    results = []
+
+    bikeLaneIndex = measure('index', results, SegmentIndex, lanes)
+    subsetRoads = measure('subset', results,
+                          lambda: roads.take(np.flatnonzero(bikeLaneIndex.linesWithin(roads, distFromBikeLanes))))
+    points = measure('tri-point', results, subsetRoads.samplePoints, sampleCount)
+    nearFids, nearDists = measure('near', results, bikeLaneIndex.nearest,
+                                  points['x'], points['y'], distFromBikeLanes)
+    coverage = measure('coverage', results, coverageArrays,
+                       points['LineId'], points['LinePos'], nearFids, nearDists, sampleCount)
+
+    agencies = [('', wfrcBikeLaneFields, laneAttributes, wfrcTranslator()),
+                ('-slcounty', slCountyBikeLaneFields, slCountyAttributes(len(lanes), seed), slCountyTranslator())]
+    for suffix, laneFields, attributes, translator in agencies:
+        laneRows = dict(zip(lanes.ids.tolist(), zip(*[attributes[f] for f in laneFields])))
+        joinedRows = measure('join' + suffix, results,
+                             lambda: list(iterJoinedRows(iterCoverageArrayRows(coverage), laneRows, laneFields,
+                                                         Translator([]))))
+        laneColumns = len(coverage.dtype.names)
+        columns = dict((f, [r[laneColumns + i] for r in joinedRows]) for i, f in enumerate(laneFields))
+        for field in translator.outputFields:
+            columns.setdefault(field, [None] * len(joinedRows))
+        measure('translate' + suffix, results, translator.translate, columns)
+
+    rowCounts = {'roads': len(roads), 'bikeLanes': len(lanes), 'subsetRoads': len(subsetRoads),
+                 'points': len(points), 'coverageRows': len(coverage)}
+    for result in results:
+        result.update({'network': network, 'segments': segmentCount, 'seed': seed})
+        result.update(rowCounts)
+    return results
+
+
+def main(argv=None):
+    """Run benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--network', nargs='+', default=['grid', 'organic'], choices=['grid', 'organic'])
+    parser.add_argument('--segments', nargs='+', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--distance', type=float, default=12.0)
+    parser.add_argument('--samples', type=int, default=3)
+    parser.add_argument('--output', help='Append results as json lines to this file')
+    args = parser.parse_args(argv)
+
+    allResults = []
+    for network in args.network:
+        for segmentCount in args.segments:
+            results = runBenchmark(network, segmentCount, args.seed, args.distance, args.samples)
+            for result in results:
+                print('{network:8} {segments:>8} {stage:18} {seconds:>9.4f}s {peak:>12}'.format(
+                    peak='' if result['peakBytes'] is None else '{:.1f} MB'.format(result['peakBytes'] / 1e6),
+                    **result))
+            allResults.extend(results)
+
+    if args.output:
+        with open(args.output, 'a') as outputFile:
+            for result in allResults:
+                outputFile.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Local columnar snapshots of source datasets that can be memory mapped. Does not require arcpy."""
+import hashlib
+import numpy as np
+import os
+import shutil
+import tempfile
+from linearrays import LineArrays
+
+lineArrayNames = ['ids', 'partOffsets', 'vertexOffsets', 'x', 'y']
+
+
+def fingerprint(*parts):
+    """Get a cache key from anything that identifies a dataset version."""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def attributeColumn(values):
+    """Convert attribute values to an array that can be memory mapped."""
+    column = np.asarray(values)
+    if column.dtype == object:
+        # Text fields, None is stored as an empty string.
+        column = np.array([u'' if v is None else v for v in values], dtype='U')
+    return column
+
+
+class DatasetCache(object):
+    """Store LineArrays and attribute columns as .npy files keyed by dataset fingerprint."""
+
+    def __init__(self, directory, maxBytes):
+        """constructor."""
+        self.directory = directory
+        self.maxBytes = maxBytes
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _entryPath(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Get memory mapped (LineArrays, {field: column}) for a fingerprint, or None if it is not cached."""
+        entryPath = self._entryPath(key)
+        if not os.path.isdir(entryPath):
+            return None
+        os.utime(entryPath, None)  # Mark as recently used
+
+        arrays = dict((name, np.load(os.path.join(entryPath, name + '.npy'), mmap_mode='r'))
+                      for name in lineArrayNames)
+        attributes = {}
+        for fileName in os.listdir(entryPath):
+            if fileName.startswith('attribute_'):
+                attributes[fileName[len('attribute_'):-len('.npy')]] = np.load(os.path.join(entryPath, fileName),
+                                                                               mmap_mode='r')
+        lines = LineArrays(arrays['ids'], arrays['partOffsets'], arrays['vertexOffsets'], arrays['x'], arrays['y'])
+        return lines, attributes
+
+    def put(self, key, lines, attributes=None):
+        """Snapshot lines and {field: values} attributes for a fingerprint."""
+        tempPath = tempfile.mkdtemp(dir=self.directory)
+        for name in lineArrayNames:
+            np.save(os.path.join(tempPath, name + '.npy'), getattr(lines, name))
+        for field, values in (attributes or {}).items():
+            np.save(os.path.join(tempPath, 'attribute_' + field + '.npy'), attributeColumn(values))
+
+        entryPath = self._entryPath(key)
+        if os.path.isdir(entryPath):
+            shutil.rmtree(entryPath)
+        os.rename(tempPath, entryPath)  # Readers never see a partial entry
+        self.evict()
+
+    def _entrySize(self, entryPath):
+        return sum(os.path.getsize(os.path.join(entryPath, f)) for f in os.listdir(entryPath))
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in maxBytes."""
+        entries = [self._entryPath(name) for name in os.listdir(self.directory)]
+        entries = sorted((p for p in entries if os.path.isdir(p)), key=os.path.getmtime)
+        totalBytes = sum(self._entrySize(p) for p in entries)
+        # The newest entry is kept even when it is larger than maxBytes on its own.
+        while totalBytes > self.maxBytes and len(entries) > 1:
+            oldest = entries.pop(0)
+            totalBytes -= self._entrySize(oldest)
+            shutil.rmtree(oldest, ignore_errors=True)  # Entries mapped by another process stay until next time
@@ -0,0 +1,203 @@
+"""Compare the LineCoverage output and runtime of two coverage configurations. Does not require arcpy.
+
+usage: python compare.py --baseline sampled --candidate exact --network grid --segments 10000
+       python compare.py --baseline fixture:arcpyBaseline.json --candidate sampled
+
+A fixture is a LineCoverage table recorded from an arcpy run with recordCoverageFixture in line-coverage.py.
+It names the cache snapshots of its inputs so the candidate runs on the same roads and bike lanes.
+"""
+from __future__ import print_function
+import argparse
+import json
+import numpy as np
+import sys
+from cache import DatasetCache
+from coverage import coverageDtype
+from nearest import SegmentIndex
+from pipeline import roadCoverageArrays, tiledRoadCoverageArrays
+from synthetic import syntheticNetwork
+from time import time
+
+defaultTolerances = {'Precent': 0.01, 'JoinDistSum': 0.01, 'Interx': 0, 'AllUniqueIds': 0}
+
+
+def _nearRoads(roads, lanes, distFromBikeLanes):
+    """Get the roads within distFromBikeLanes of a bike lane, the subset step every configuration starts with."""
+    laneIndex = SegmentIndex(lanes, minCellSize=distFromBikeLanes)
+    return roads.take(np.flatnonzero(laneIndex.linesWithin(roads, distFromBikeLanes)))
+
+
+configurations = {
+    'sampled': lambda roads, lanes, dist, samples: roadCoverageArrays(_nearRoads(roads, lanes, dist), lanes, dist,
+                                                                      samples),
+    'exact': lambda roads, lanes, dist, samples: roadCoverageArrays(_nearRoads(roads, lanes, dist), lanes, dist,
+                                                                    samples, exact=True),
+    'nearest2': lambda roads, lanes, dist, samples: roadCoverageArrays(_nearRoads(roads, lanes, dist), lanes, dist,
+                                                                       samples, nearestCount=2),
+    'tiled': lambda roads, lanes, dist, samples: tiledRoadCoverageArrays(_nearRoads(roads, lanes, dist), lanes, dist,
+                                                                         samples)
+}
+
+
+def saveFixture(fixturePath, coverageRows, inputs, seconds):
+    """Record LineCoverage rows, the inputs they came from and how long they took."""
+    with open(fixturePath, 'w') as fixtureFile:
+        json.dump({'inputs': inputs,
+                   'seconds': seconds,
+                   'fields': [f[0] for f in coverageDtype],
+                   'rows': [list(row) for row in coverageRows]},
+                  fixtureFile,
+                  default=lambda value: value.item())  # numpy scalars from a coverage array
+
+
+def loadFixture(fixturePath):
+    """Get (coverage array, inputs, seconds) from a fixture."""
+    with open(fixturePath) as fixtureFile:
+        fixture = json.load(fixtureFile)
+    coverage = np.empty(len(fixture['rows']), dtype=coverageDtype)
+    for i, field in enumerate(fixture['fields']):
+        coverage[field] = [row[i] for row in fixture['rows']]
+    return coverage, fixture['inputs'], fixture['seconds']
+
+
+def loadInputs(inputs):
+    """Get (roads, bikeLanes) for a {'network', 'segments', 'seed'} or {'cache', 'roads', 'bikeLanes'} dict.
+
+    Other keys, such as a fixture's distFromBikeLanes and sampleCount, are ignored."""
+    if 'cache' in inputs:
+        datasetCache = DatasetCache(inputs['cache'], float('inf'))
+        roads = datasetCache.get(inputs['roads'])
+        lanes = datasetCache.get(inputs['bikeLanes'])
+        if roads is None or lanes is None:
+            raise ValueError('Snapshots {} and {} are not in {}'.format(inputs['roads'], inputs['bikeLanes'],
+                                                                        inputs['cache']))
+        return roads[0], lanes[0]
+    roads, lanes, laneAttributes = syntheticNetwork(inputs['network'], inputs['segments'], inputs['seed'])
+    return roads, lanes
+
+
+def runConfiguration(name, roads, lanes, distFromBikeLanes, sampleCount):
+    """Get (coverage array, seconds) for a named configuration."""
+    startTime = time()
+    coverage = configurations[name](roads, lanes, distFromBikeLanes, sampleCount)
+    return coverage, time() - startTime
+
+
+def _pairKeys(coverage):
+    """Get one int64 key per (LineId, CoverId) pair."""
+    return (coverage['LineId'].astype(np.int64) << 32) | (coverage['CoverId'].astype(np.int64) & 0xffffffff)
+
+
+def compareCoverage(baseline, candidate, tolerances=defaultTolerances):
+    """Diff two coverage arrays per (LineId, CoverId).
+
+    Precision and recall are over pairs with a bike lane, CoverId -1 rows only take part in the field diffs.
+    For each field the result has the matched rows that differ by more than its tolerance and the largest
+    difference."""
+    baselineKeys = _pairKeys(baseline)
+    candidateKeys = _pairKeys(candidate)
+    if len(np.unique(baselineKeys)) != len(baselineKeys) or len(np.unique(candidateKeys)) != len(candidateKeys):
+        raise ValueError('Coverage has more than one row for a LineId and CoverId')
+    matchedKeys = np.intersect1d(baselineKeys, candidateKeys)
+    baselineOrder = np.argsort(baselineKeys)
+    baselineRows = baselineOrder[np.searchsorted(baselineKeys, matchedKeys, sorter=baselineOrder)]
+    candidateOrder = np.argsort(candidateKeys)
+    candidateRows = candidateOrder[np.searchsorted(candidateKeys, matchedKeys, sorter=candidateOrder)]
+
+    baselineLanes = int((baseline['CoverId'] != -1).sum())
+    candidateLanes = int((candidate['CoverId'] != -1).sum())
+    matchedLanes = int((baseline['CoverId'][baselineRows] != -1).sum())
+    result = {'baselineRows': len(baseline),
+              'candidateRows': len(candidate),
+              'matchedRows': len(matchedKeys),
+              'precision': matchedLanes / float(candidateLanes) if candidateLanes else 1.0,
+              'recall': matchedLanes / float(baselineLanes) if baselineLanes else 1.0,
+              'lines': len(np.union1d(baseline['LineId'], candidate['LineId']))}
+    for field in ['Precent', 'Interx', 'JoinDistSum', 'AllUniqueIds']:
+        difference = np.abs(baseline[field][baselineRows].astype(np.float64) -
+                            candidate[field][candidateRows].astype(np.float64))
+        result[field + 'Mismatches'] = int((difference > tolerances[field] + 1e-9).sum())
+        result[field + 'MaxDiff'] = float(difference.max()) if len(difference) else 0.0
+    return result
+
+
+def runComparison(baseline, candidate, inputs, distFromBikeLanes=12.0, sampleCount=3, tolerances=defaultTolerances):
+    """Run or load both configurations on the same inputs and get the comparison with the speedup.
+
+    A configuration name of fixture:<path> loads a recorded run. Its distance and sample count are always used
+    and its inputs are used when inputs is None."""
+    recorded = {}
+    for name in [baseline, candidate]:
+        if name.startswith('fixture:'):
+            recorded[name] = loadFixture(name[len('fixture:'):])
+            fixtureInputs = recorded[name][1]
+            distFromBikeLanes = fixtureInputs.get('distFromBikeLanes', distFromBikeLanes)
+            sampleCount = fixtureInputs.get('sampleCount', sampleCount)
+            if inputs is None:
+                inputs = fixtureInputs
+    if inputs is None:
+        raise ValueError('Inputs are required when neither configuration is a fixture')
+
+    roads, lanes = loadInputs(inputs)
+    runs = []
+    for name in [baseline, candidate]:
+        if name in recorded:
+            runs.append((recorded[name][0], recorded[name][2]))
+        else:
+            runs.append(runConfiguration(name, roads, lanes, distFromBikeLanes, sampleCount))
+
+    result = compareCoverage(runs[0][0], runs[1][0], tolerances)
+    result.update({'baseline': baseline,
+                   'candidate': candidate,
+                   'inputs': inputs,
+                   'distFromBikeLanes': distFromBikeLanes,
+                   'sampleCount': sampleCount,
+                   'baselineSeconds': round(runs[0][1], 4),
+                   'candidateSeconds': round(runs[1][1], 4),
+                   'speedup': round(runs[0][1] / runs[1][1], 2) if runs[1][1] > 0 else None})
+    return result
+
+
+def main(argv=None):
+    """Compare configurations from the command line, exits with 1 when any field is outside its tolerance."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--baseline', default='sampled', help='{} or fixture:<path>'.format(sorted(configurations)))
+    parser.add_argument('--candidate', default='exact', help='{} or fixture:<path>'.format(sorted(configurations)))
+    parser.add_argument('--network', choices=['grid', 'organic'], help='Synthetic inputs')
+    parser.add_argument('--segments', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache', help='DatasetCache directory with --roads and --bike-lanes snapshot keys')
+    parser.add_argument('--roads')
+    parser.add_argument('--bike-lanes', dest='bikeLanes')
+    parser.add_argument('--distance', type=float, default=12.0)
+    parser.add_argument('--samples', type=int, default=3)
+    for field, tolerance in sorted(defaultTolerances.items()):
+        parser.add_argument('--tolerance-' + field, dest=field, type=float, default=tolerance)
+    parser.add_argument('--output', help='Append the result as a json line to this file')
+    args = parser.parse_args(argv)
+
+    inputs = None
+    if args.cache:
+        inputs = {'cache': args.cache, 'roads': args.roads, 'bikeLanes': args.bikeLanes}
+    elif args.network:
+        inputs = {'network': args.network, 'segments': args.segments, 'seed': args.seed}
+    tolerances = dict((field, getattr(args, field)) for field in defaultTolerances)
+    result = runComparison(args.baseline, args.candidate, inputs, args.distance, args.samples, tolerances)
+
+    print('{baseline} {baselineSeconds}s vs {candidate} {candidateSeconds}s: speedup {speedup}'.format(**result))
+    print('rows {baselineRows} vs {candidateRows}, matched {matchedRows}, '
+          'precision {precision:.4f}, recall {recall:.4f}'.format(**result))
+    for field in ['Precent', 'Interx', 'JoinDistSum', 'AllUniqueIds']:
+        print('{:13} {:>8} outside {} (max diff {:.4f})'.format(field,
+                                                               result[field + 'Mismatches'],
+                                                               tolerances[field],
+                                                               result[field + 'MaxDiff']))
+    if args.output:
+        with open(args.output, 'a') as outputFile:
+            outputFile.write(json.dumps(result) + '\n')
+    mismatched = any(result[f + 'Mismatches'] for f in defaultTolerances)
+    return 1 if mismatched or result['precision'] < 1 or result['recall'] < 1 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,9 @@
 """Global settings and paths."""
 import os
+import shutil
 import arcpy
-from time import strftime
+from instrumentation import StageLog
+from time import strftime, time
 
 
 class Configs(object):
@@ -9,6 +11,14 @@ class Configs(object):
     outputWorkspace = None
     tempWorkspace = None
     dataGdb = None
+    manifestDirectory = None
+    cacheDirectory = None
+    cacheMaxBytes = 20 * 1024 ** 3
+    tempDirectory = None
+    keepIntermediates = False  # Also write the numpy pipeline's tri-points to the temp workspace for debugging
+    staleWorkspaceHours = 24
+    outputFormat = 'gdb'  # 'gdb', 'gpkg', 'sqlite' or 'parquet', parquet requires pyarrow
+    outputBatchSize = 50000
 
     @staticmethod
     def setupWorkspace(dataDirectory):
@@ -16,12 +26,39 @@ class Configs(object):
 
         if Configs.uniqueRunNum is None:
             Configs.uniqueRunNum = strftime("%Y%m%d_%H%M%S")
+        StageLog.runId = Configs.uniqueRunNum
         if Configs.outputWorkspace is None and Configs.tempWorkspace is None and Configs.dataGdb is None:
             # Workspaces
             Configs.dataGdb = os.path.join(dataDirectory, 'SourceData.gdb')
             Configs.outputWorkspace = os.path.join(dataDirectory, 'OutputResults.gdb')  # TODO: assumes user provided
-            # Create a temp unique temp workspace for this run
-            tempDir = os.path.join(dataDirectory, 'temp')
-            arcpy.CreateFileGDB_management(tempDir,
+            Configs.manifestDirectory = os.path.join(dataDirectory, 'manifests')
+            Configs.cacheDirectory = os.path.join(dataDirectory, 'cache')
+            StageLog.path = os.path.join(dataDirectory, 'stageLog.jsonl')
+            # The temp workspace for this run is only created if something is materialized
+            Configs.tempDirectory = os.path.join(dataDirectory, 'temp')
+            Configs.removeStaleWorkspaces()
+
+    @staticmethod
+    def getTempWorkspace():
+        """Get the temp workspace for this run, creating it the first time it is needed."""
+        if Configs.tempWorkspace is None:
+            arcpy.CreateFileGDB_management(Configs.tempDirectory,
                                            'run_' + Configs.uniqueRunNum)
-            Configs.tempWorkspace = os.path.join(tempDir, 'run_' + Configs.uniqueRunNum + '.gdb')
+            Configs.tempWorkspace = os.path.join(Configs.tempDirectory, 'run_' + Configs.uniqueRunNum + '.gdb')
+        return Configs.tempWorkspace
+
+    @staticmethod
+    def removeStaleWorkspaces():
+        """Delete temp run workspaces older than staleWorkspaceHours."""
+        if Configs.tempDirectory is None or not os.path.isdir(Configs.tempDirectory):
+            return
+        oldestKept = time() - Configs.staleWorkspaceHours * 3600
+        for name in os.listdir(Configs.tempDirectory):
+            workspace = os.path.join(Configs.tempDirectory, name)
+            if not (name.startswith('run_') and name.endswith('.gdb') and os.path.isdir(workspace)):
+                continue
+            # Writes inside a geodatabase do not always touch the folder, so the newest file dates it.
+            lastWrite = max([os.path.getmtime(workspace)] +
+                            [os.path.getmtime(os.path.join(workspace, f)) for f in os.listdir(workspace)])
+            if lastWrite < oldestKept:
+                shutil.rmtree(workspace, ignore_errors=True)  # Workspaces locked by a running process stay
@@ -0,0 +1,287 @@
+"""Accumulate coverage of road lines by the features near their sample points. Does not require arcpy."""
+import heapq
+import numpy as np
+import pickle
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+
+# Fields of a coverage array, the LineCoverage table fields
+coverageDtype = [('LineId', 'i4'),
+                 ('CoverId', 'i4'),
+                 ('JoinDistSum', 'f8'),
+                 ('Precent', 'f8'),
+                 ('Interx', 'i4'),
+                 ('AllUniqueIds', 'i2')]
+
+
+class OtherFeature(object):
+    """Accumulate information about features that cover lines."""
+
+    def __init__(self, featureId):
+        """constructor."""
+        self.id = featureId
+        self.coveragePercent = 0
+        self.intersections = 0
+        self.joinDistSum = 0
+
+    def __str__(self):
+        """Override str."""
+        return '{}: coverage: {} interx: {}'.format(self.id,
+                                                    self.coveragePercent,
+                                                    self.intersections)
+
+
+class LineCoverage (object):
+    """Create and store coverage percentages."""
+
+    def __init__(self, lineId, otherId, linePos):
+        """constructor."""
+        self.lineId = lineId
+        self.lastOtherIds = set()
+        self.lastOtherPos = linePos
+        self.nearestIds = set()  # Closest id of each point
+        self.others = {}  # {'OtherId': 'accumulation'}
+
+    def accumulateCoverage(self, otherId, currentLinePos, joinDist):
+        """Accumulate coverage percentage for id."""
+        self.accumulateCandidates([(otherId, joinDist)], currentLinePos)
+
+    def accumulateCandidates(self, candidates, currentLinePos):
+        """Accumulate coverage for every (otherId, joinDist) candidate of one point, closest first."""
+        for otherId, joinDist in candidates:
+            if otherId in self.lastOtherIds:  # Check if otherId is a continuation of an id at the last point
+                self.others[otherId].coveragePercent += float(currentLinePos) - self.lastOtherPos
+            elif otherId not in self.others:
+                self.others[otherId] = OtherFeature(otherId)
+
+            self.others[otherId].intersections += 1
+            self.others[otherId].joinDistSum += joinDist
+
+        self.nearestIds.add(candidates[0][0])
+        self.lastOtherIds = set(otherId for otherId, joinDist in candidates)
+        self.lastOtherPos = currentLinePos
+
+    def getCoverageRows(self, sampleCount=3):
+        """Get rows for the coverage table output, ordered by cover id."""
+        tempRows = []
+        for id in sorted(self.others):
+            coverFeature = self.others[id]
+            tempRows.append([self.lineId,
+                             coverFeature.id,
+                             round(coverFeature.joinDistSum, 4),
+                             coverFeature.coveragePercent,
+                             coverFeature.intersections])
+
+        # Add valid, unique, id full coverage field
+        validCoverIds = set(self.nearestIds)
+        validCoverIds.discard(-1)
+        if len(validCoverIds) == sampleCount:  # One unique id for each point created per road line.
+            for r in tempRows:
+                r.append(1)
+        else:
+            for r in tempRows:
+                r.append(0)
+        return tempRows
+
+
+def iterCoverageRows(rows, sampleCount=3):
+    """Generate coverage table rows from (LineId, LinePos, NEAR_FID, NEAR_DIST) rows grouped by LineId."""
+    for lineId, lineRows in groupby(rows, key=itemgetter(0)):
+        lineCoverage = None
+        # Only the sample points of one line are held in memory.
+        for lineId, linePos, otherId, otherDist in sorted(lineRows, key=itemgetter(1)):
+            if lineCoverage is None:
+                lineCoverage = LineCoverage(lineId, otherId, linePos)
+            lineCoverage.accumulateCoverage(otherId, linePos, otherDist)
+
+        for coverageRow in lineCoverage.getCoverageRows(sampleCount):
+            yield coverageRow
+
+
+def iterCandidateCoverageRows(rows, sampleCount=3):
+    """Generate coverage table rows from (LineId, LinePos, nearFids, nearDists) rows grouped by LineId.
+
+    nearFids and nearDists are the closest first candidates of a point, padded with -1."""
+    for lineId, lineRows in groupby(rows, key=itemgetter(0)):
+        lineCoverage = None
+        for lineId, linePos, otherIds, otherDists in sorted(lineRows, key=itemgetter(1)):
+            candidates = [(i, d) for i, d in zip(otherIds, otherDists) if i != -1] or [(-1, otherDists[0])]
+            if lineCoverage is None:
+                lineCoverage = LineCoverage(lineId, candidates[0][0], linePos)
+            lineCoverage.accumulateCandidates(candidates, linePos)
+
+        for coverageRow in lineCoverage.getCoverageRows(sampleCount):
+            yield coverageRow
+
+
+def candidateCoverageArrays(lineIds, linePos, nearFids, nearDists, sampleCount=3):
+    """Same as coverageArrays with (pointCount, k) nearestK candidates for each point.
+
+    Produces the same rows as LineCoverage.accumulateCandidates. Coverage continues for every candidate that was
+    also a candidate of the previous point and AllUniqueIds counts only the closest candidate of each point."""
+    order = np.lexsort((linePos, lineIds))
+    lines = np.asarray(lineIds)[order]
+    positions = np.asarray(linePos, dtype=np.float64)[order]
+    nearFids = np.asarray(nearFids)[order]
+    nearDists = np.asarray(nearDists, dtype=np.float64)[order]
+
+    # One entry per candidate, points without candidates keep their first -1 slot.
+    isEntry = nearFids != -1
+    isEntry[:, 0] |= ~isEntry.any(axis=1)
+    entryPoint, entryRank = np.nonzero(isEntry)  # Ordered by point then rank
+    entryLines = lines[entryPoint]
+    others = nearFids[entryPoint, entryRank]
+    distances = nearDists[entryPoint, entryRank]
+
+    # Group entries by (LineId, otherId) in point order
+    groupOrder = np.lexsort((entryPoint, others, entryLines))
+    groupStart = np.ones(len(entryPoint), dtype=bool)
+    groupStart[1:] = ((entryLines[groupOrder][1:] != entryLines[groupOrder][:-1]) |
+                      (others[groupOrder][1:] != others[groupOrder][:-1]))
+    group = np.empty(len(entryPoint), dtype=np.int64)
+    group[groupOrder] = np.cumsum(groupStart) - 1
+    groupCount = int(groupStart.sum())
+    firstEntry = groupOrder[groupStart]  # Ordered by (LineId, otherId)
+
+    # An entry continues coverage when the same id was a candidate of the previous point on the line.
+    previous = np.zeros(len(entryPoint), dtype=bool)
+    previous[groupOrder[1:]] = ~groupStart[1:] & (entryPoint[groupOrder][1:] == entryPoint[groupOrder][:-1] + 1)
+    contribution = np.where(previous, positions[entryPoint] - positions[np.maximum(entryPoint - 1, 0)], 0.0)
+
+    coveragePercent = np.bincount(group, weights=contribution, minlength=groupCount)
+    joinDistSum = np.bincount(group, weights=distances, minlength=groupCount)
+    intersections = np.bincount(group, minlength=groupCount)
+
+    newLine = np.ones(len(lines), dtype=bool)
+    newLine[1:] = lines[1:] != lines[:-1]
+    pointLine = np.cumsum(newLine) - 1
+    # Distinct valid closest ids per line
+    closest = nearFids[:, 0]
+    closestOrder = np.lexsort((closest, pointLine))
+    distinct = np.ones(len(lines), dtype=bool)
+    distinct[1:] = ((pointLine[closestOrder][1:] != pointLine[closestOrder][:-1]) |
+                    (closest[closestOrder][1:] != closest[closestOrder][:-1]))
+    distinct &= closest[closestOrder] != -1
+    validIds = np.bincount(pointLine[closestOrder], weights=distinct, minlength=int(newLine.sum()))
+
+    coverage = np.empty(groupCount, dtype=coverageDtype)
+    coverage['LineId'] = entryLines[firstEntry]
+    coverage['CoverId'] = others[firstEntry]
+    coverage['JoinDistSum'] = [round(d, 4) for d in joinDistSum.tolist()]
+    coverage['Precent'] = coveragePercent
+    coverage['Interx'] = intersections
+    coverage['AllUniqueIds'] = validIds[pointLine[entryPoint[firstEntry]]] == sampleCount
+    return coverage
+
+
+def coverageArrays(lineIds, linePos, nearFids, nearDists, sampleCount=3):
+    """Compute the coverage table for all lines at once with a grouped reduction over sample point arrays.
+
+    Produces the same rows as LineCoverage in the same order, by LineId and then CoverId.
+    """
+    order = np.lexsort((linePos, lineIds))  # Stable, like sorted(rows, key=itemgetter(0, 1))
+    lines = np.asarray(lineIds)[order]
+    positions = np.asarray(linePos, dtype=np.float64)[order]
+    others = np.asarray(nearFids)[order]
+    distances = np.asarray(nearDists, dtype=np.float64)[order]
+
+    newLine = np.ones(len(lines), dtype=bool)
+    newLine[1:] = lines[1:] != lines[:-1]
+    # A row continues coverage when the previous point on the line had the same other id.
+    continuation = np.zeros(len(lines), dtype=bool)
+    continuation[1:] = ~newLine[1:] & (others[1:] == others[:-1])
+    contribution = np.zeros(len(lines), dtype=np.float64)
+    contribution[1:] = positions[1:] - positions[:-1]
+    contribution[~continuation] = 0.0
+
+    # Group rows by (LineId, otherId)
+    groupOrder = np.lexsort((others, lines))
+    groupStart = np.ones(len(lines), dtype=bool)
+    groupStart[1:] = ((lines[groupOrder][1:] != lines[groupOrder][:-1]) |
+                      (others[groupOrder][1:] != others[groupOrder][:-1]))
+    group = np.empty(len(lines), dtype=np.int64)
+    group[groupOrder] = np.cumsum(groupStart) - 1
+    groupCount = int(groupStart.sum())
+    firstRow = groupOrder[groupStart]  # Ordered by (LineId, otherId)
+
+    # bincount adds weights in row order, which keeps float sums identical to LineCoverage.
+    coveragePercent = np.bincount(group, weights=contribution, minlength=groupCount)
+    joinDistSum = np.bincount(group, weights=distances, minlength=groupCount)
+    intersections = np.bincount(group, minlength=groupCount)
+
+    lineIndex = (np.cumsum(newLine) - 1)[firstRow]
+    validIds = np.bincount(lineIndex, weights=others[firstRow] != -1)
+    allUniqueIds = validIds[lineIndex] == sampleCount
+
+    coverage = np.empty(groupCount, dtype=coverageDtype)
+    coverage['LineId'] = lines[firstRow]
+    coverage['CoverId'] = others[firstRow]
+    coverage['JoinDistSum'] = [round(d, 4) for d in joinDistSum.tolist()]
+    coverage['Precent'] = coveragePercent
+    coverage['Interx'] = intersections
+    coverage['AllUniqueIds'] = allUniqueIds
+    return coverage
+
+
+def mergedRangeLengths(lineIndex, coverIds, starts, ends):
+    """Get (lineIndex, coverId, length) of the union of the measure ranges of every line and cover id pair."""
+    order = np.lexsort((starts, coverIds, lineIndex))
+    lineIndex = np.asarray(lineIndex)[order]
+    coverIds = np.asarray(coverIds)[order]
+    starts = np.asarray(starts, dtype=np.float64)[order]
+    ends = np.asarray(ends, dtype=np.float64)[order]
+    if len(starts) == 0:
+        return lineIndex, coverIds, starts
+
+    newGroup = np.ones(len(starts), dtype=bool)
+    newGroup[1:] = (lineIndex[1:] != lineIndex[:-1]) | (coverIds[1:] != coverIds[:-1])
+    # Shift each group past the previous one so one running maximum stays inside groups.
+    shift = (np.cumsum(newGroup) - 1) * (ends.max() - starts.min() + 1.0)
+    runningEnd = np.maximum.accumulate(ends + shift) - shift
+    # A range that starts after every earlier range in its group has ended starts a new merged range.
+    newRange = newGroup.copy()
+    newRange[1:] |= starts[1:] > runningEnd[:-1]
+    rangeStarts = np.flatnonzero(newRange)
+    rangeLengths = np.maximum.reduceat(ends, rangeStarts) - starts[rangeStarts]
+
+    groupStarts = np.flatnonzero(newGroup)
+    rangeGroup = np.cumsum(newGroup)[rangeStarts] - 1
+    return (lineIndex[groupStarts],
+            coverIds[groupStarts],
+            np.bincount(rangeGroup, weights=rangeLengths, minlength=len(groupStarts)))
+
+
+def iterCoverageArrayRows(coverage):
+    """Generate coverage table rows from a coverageArrays result."""
+    for row in coverage.tolist():
+        yield list(row)
+
+
+def _readSpilledRows(spillFile):
+    """Read back rows written by externalSort."""
+    spillFile.seek(0)
+    while True:
+        try:
+            yield pickle.load(spillFile)
+        except EOFError:
+            spillFile.close()
+            return
+
+
+def externalSort(rows, key=itemgetter(0, 1), chunkSize=500000):
+    """Sort rows by spilling sorted chunks to temp files and merging them."""
+    spillFiles = []
+    chunk = []
+    for row in rows:
+        chunk.append((key(row), tuple(row)))
+        if len(chunk) >= chunkSize:
+            spillFile = tempfile.TemporaryFile()
+            for keyedRow in sorted(chunk, key=itemgetter(0)):
+                pickle.dump(keyedRow, spillFile, pickle.HIGHEST_PROTOCOL)
+            spillFiles.append(spillFile)
+            chunk = []
+
+    chunk.sort(key=itemgetter(0))
+    for keyValue, row in heapq.merge(iter(chunk), *[_readSpilledRows(f) for f in spillFiles]):
+        yield row
@@ -0,0 +1,125 @@
+"""Per stage wall time, CPU time, row counts and peak memory written as json lines. Does not require arcpy."""
+import cProfile
+import json
+import os
+import sys
+from contextlib import contextmanager
+from functools import wraps
+from time import time
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class StageLog(object):
+    """Settings for stage records. Configs.setupWorkspace sets path and runId."""
+    path = None  # json lines file, records are not written when None
+    runId = None
+    profileStage = None  # Name of a stage to profile
+    profiler = 'cprofile'  # 'cprofile' or 'sampling', sampling requires pyinstrument
+    activeStages = []
+    profiling = False  # True while a stage is profiled, nested stages are not profiled again
+
+
+def peakRssKb():
+    """Get the peak resident memory of this process in KB, or None when it is not available."""
+    if resource is not None:
+        maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxRss // 1024 if sys.platform == 'darwin' else maxRss  # Bytes on macOS, KB elsewhere
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        if hasattr(memory, 'peak_wset'):  # Windows
+            return memory.peak_wset // 1024
+    return None
+
+
+def cpuSeconds():
+    """Get user plus system CPU time of this process."""
+    times = os.times()
+    return times[0] + times[1]
+
+
+def recordRows(rowsIn=None, rowsOut=None):
+    """Set row counts on the innermost running stage."""
+    if not StageLog.activeStages:
+        return
+    record = StageLog.activeStages[-1]
+    if rowsIn is not None:
+        record['rowsIn'] = rowsIn
+    if rowsOut is not None:
+        record['rowsOut'] = rowsOut
+
+
+@contextmanager
+def _profile(stageName):
+    """Profile a stage when it is StageLog.profileStage."""
+    if StageLog.profileStage != stageName or StageLog.profiling:
+        yield
+        return
+
+    outputBase = os.path.join(os.path.dirname(StageLog.path or '.'),
+                              'profile_{}_{}'.format(StageLog.runId, stageName))
+    StageLog.profiling = True
+    try:
+        if StageLog.profiler == 'sampling':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                with open(outputBase + '.txt', 'w') as outputFile:
+                    outputFile.write(profiler.output_text())
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(outputBase + '.prof')
+    finally:
+        StageLog.profiling = False
+
+
+@contextmanager
+def stage(stageName):
+    """Record a stage. Row counts are added with recordRows."""
+    record = {'runId': StageLog.runId,
+              'stage': stageName,
+              'parent': StageLog.activeStages[-1]['stage'] if StageLog.activeStages else None,
+              'rowsIn': None,
+              'rowsOut': None}
+    StageLog.activeStages.append(record)
+    startTime = time()
+    startCpu = cpuSeconds()
+    try:
+        with _profile(stageName):
+            yield record
+    finally:
+        StageLog.activeStages.pop()
+        record['wallSeconds'] = round(time() - startTime, 4)
+        record['cpuSeconds'] = round(cpuSeconds() - startCpu, 4)
+        record['peakRssKb'] = peakRssKb()
+        record['endTime'] = round(time(), 3)
+        if StageLog.path is not None:
+            with open(StageLog.path, 'a') as logFile:
+                logFile.write(json.dumps(record) + '\n')
+
+
+def instrumented(stageName):
+    """Decorate a function to record it as a stage."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(stageName):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
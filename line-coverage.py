@@ -2,73 +2,22 @@
 Find coverage information for bike lane data and roads.
 """
 import arcpy
+import hashlib
+import numpy
 import os
+from cache import DatasetCache, fingerprint
+from compare import saveFixture
 from configs import Configs
+from instrumentation import instrumented, recordRows
+from coverage import LineCoverage, OtherFeature, coverageArrays, externalSort, iterCoverageArrayRows, iterCoverageRows
+from linearrays import LineArrays, isIn
+from manifest import RunManifest, affectedRoadIds, diffHashes, geometryHashes
+from nearest import SegmentIndex, iterLinesNear
+from pipeline import pipelinedRoadCoverageArrays, roadCoverageArrays, tiledRoadCoverageArrays
+from preprocessing import RoadPreprocessing
 from time import time
-from operator import itemgetter
-
-
-class OtherFeature(object):
-    """Accumulate information about features that cover lines."""
-
-    def __init__(self, featureId):
-        """constructor."""
-        self.id = featureId
-        self.coveragePercent = 0
-        self.intersections = 0
-        self.joinDistSum = 0
-
-    def __str__(self):
-        """Override str."""
-        return '{}: coverage: {} interx: {}'.format(self.id,
-                                                    self.coveragePercent,
-                                                    self.intersections)
-
-
-class LineCoverage (object):
-    """Create and store coverage percentages."""
-
-    def __init__(self, lineId, otherId, linePos):
-        """constructor."""
-        self.lineId = lineId
-        self.lastOtherId = None
-        self.lastOtherPos = linePos
-        self.others = {}  # {'OtherId': 'accumulation'}
-
-    def accumulateCoverage(self, otherId, currentLinePos, joinDist):
-        """Accumulate coverage percentage for id."""
-
-        if self.lastOtherId == otherId:  # Check if otherId is a continuation of the last id seen
-            self.others[otherId].coveragePercent += float(currentLinePos) - self.lastOtherPos
-        elif otherId not in self.others:
-            self.others[otherId] = OtherFeature(otherId)
-
-        self.others[otherId].intersections += 1
-        self.others[otherId].joinDistSum += joinDist
-        self.lastOtherId = otherId
-        self.lastOtherPos = currentLinePos
-
-    def getCoverageRows(self):
-        """Get rows for the coverage table output."""
-        tempRows = []
-        for id in self.others:
-            coverFeature = self.others[id]
-            tempRows.append([self.lineId,
-                             coverFeature.id,
-                             round(coverFeature.joinDistSum, 4),
-                             coverFeature.coveragePercent,
-                             coverFeature.intersections])
-
-        # Add valid, unique, id full coverage field
-        validCoverIds = set([r[1] for r in tempRows])
-        validCoverIds.discard(-1)
-        if len(validCoverIds) == 3:  # 3 is used because 3 points are created per road line.
-            for r in tempRows:
-                r.append(1)
-        else:
-            for r in tempRows:
-                r.append(0)
-        return tempRows
+from translation import iterJoinedRows, joinedFields
+from writers import BufferedWriter, coverageFields, sinkForPath
 
 
 class Table (object):
@@ -92,9 +41,11 @@ class Table (object):
             for field in fieldList:
                 name = field[0]
                 fieldType = field[1]
+                fieldLength = field[2] if len(field) > 2 else None
                 arcpy.AddField_management(tempFeature.path,
                                           name,
-                                          fieldType)
+                                          fieldType,
+                                          field_length=fieldLength)
 
         return tempFeature
 
@@ -142,86 +93,260 @@ class Feature (object):
         return tempFeature
 
 
-def createBikeLaneRoadCoverage(roadPointsWithBikeFields):
-    """Use the join fields from road point to determine bike lane that covers road segement."""
+class GdbTableSink(object):
+    """Coverage table sink for a geodatabase table written with one insert cursor."""
+
+    def __init__(self, workspace, name):
+        """constructor."""
+        self.workspace = workspace
+        self.name = name
+        self.table = None
+        self.cursor = None
+
+    def open(self, schema):
+        """Create the table with every field before any rows are written."""
+        self.table = Table.createTable(self.workspace, self.name, schema)
+        self.cursor = arcpy.da.InsertCursor(self.table.path, [x[0] for x in schema])
+
+    def write(self, rows):
+        """Insert a batch of rows."""
+        for row in rows:
+            self.cursor.insertRow(row)
+
+    def close(self):
+        """Release the insert cursor."""
+        del self.cursor
+        self.cursor = None
+
+    def abort(self):
+        """Release the insert cursor and delete the partly written table."""
+        self.close()
+        arcpy.Delete_management(self.table.path)
+
+    def result(self):
+        """Get the table object."""
+        return self.table
+
+
+def coverageSink(name):
+    """Get the sink for an output table from Configs.outputFormat."""
+    if Configs.outputFormat == 'gdb':
+        return GdbTableSink(Configs.outputWorkspace, name)
+    outputDirectory = os.path.dirname(Configs.outputWorkspace)
+    if Configs.outputFormat == 'parquet':
+        return sinkForPath(os.path.join(outputDirectory, name + '.parquet'), name)
+    return sinkForPath(os.path.join(outputDirectory, 'OutputResults.' + Configs.outputFormat), name)
+
+
+def createCoverageTable(coverageRows, extraFields=[], tableName=None):
+    """Create the LineCoverage table with its final schema and write coverage rows to it in batches.
+
+    tableName defaults to LineCoverage_<uniqueRunNum>.
+    Returns a Table for the gdb output format or the output file path for other formats."""
+    if tableName is None:
+        tableName = 'LineCoverage_' + Configs.uniqueRunNum
+    # A failure while rows are generated releases the sink and removes the partly written table.
+    with BufferedWriter(coverageSink(tableName), coverageFields + extraFields, Configs.outputBatchSize) as writer:
+        writer.writeRows(coverageRows)
+    recordRows(rowsOut=writer.rowCount)
+
+    return writer.sink.result()
+
+
+@instrumented('coverage')
+def createBikeLaneRoadCoverage(roadPointsWithBikeFields, sampleCount=3, sortExternally=False, accumulator='stream'):
+    """Use the join fields from road point to determine bike lane that covers road segement.
+
+    accumulator is 'stream' for LineCoverage objects or 'array' for the numpy grouped reduction."""
     fields = ['LineId', 'LinePos', 'NEAR_FID', 'NEAR_DIST']  # , 'Type', 'Stat_2015']
-    rows = None
-    lineCoverages = {}
-
-    coverageFields = [('LineId', 'LONG'),
-                      ('CoverId', 'LONG'),
-                      ('JoinDistSum', 'DOUBLE'),
-                      ('Precent', 'FLOAT'),
-                      ('Interx', 'SHORT'),
-                      ('AllUniqueIds', 'SHORT')]
-    coverageTable = Table.createTable(Configs.outputWorkspace,
-                                      'LineCoverage_' + Configs.uniqueRunNum,
-                                      coverageFields)
-    tableCursor = arcpy.da.InsertCursor(coverageTable.path,
-                                        [x[0] for x in coverageFields])
-
-    with arcpy.da.SearchCursor(roadPointsWithBikeFields.path, fields) as cursor:
-        rows = sorted(cursor, key=itemgetter(0, 1))
-
-    lC = None
-    for row in rows:
-
-        lineId, linePos, otherId, otherDist = row  # , bikeType, bikeStat = row
-
-        if lineId not in lineCoverages:
-            lineCoverages[lineId] = LineCoverage(lineId, otherId, linePos)
-            if lC is not None:  # Popluate the line coverage table.
-                for lcRow in lC.getCoverageRows():
-                    tableCursor.insertRow(lcRow)
-
-        lC = lineCoverages[lineId]
-        lC.accumulateCoverage(otherId, linePos, otherDist)
-
-    # Insert last row in coverage table
-    for lcRow in lC.getCoverageRows():
-        tableCursor.insertRow(lcRow)
-    del tableCursor
 
-    return coverageTable
+    if accumulator == 'array':
+        points = arcpy.da.FeatureClassToNumPyArray(roadPointsWithBikeFields.path, fields)
+        recordRows(rowsIn=len(points))
+        coverage = coverageArrays(points['LineId'], points['LinePos'], points['NEAR_FID'], points['NEAR_DIST'],
+                                  sampleCount)
+        return createCoverageTable(iterCoverageArrayRows(coverage))
+
+    recordRows(rowsIn=int(arcpy.GetCount_management(roadPointsWithBikeFields.path).getOutput(0)))
+    # Rows are grouped by LineId at the source so each line is written and freed as soon as it is finished.
+    sqlClause = (None, None) if sortExternally else (None, 'ORDER BY LineId, LinePos')
+    with arcpy.da.SearchCursor(roadPointsWithBikeFields.path, fields, sql_clause=sqlClause) as cursor:
+        rows = externalSort(cursor) if sortExternally else cursor
+        return createCoverageTable(iterCoverageRows(rows, sampleCount))
 
 
+@instrumented('near')
 def nearPointsAndBikelanes(roadPoints, bikeLanes, nearSearchRadius):
     """Join relevent fields from bikeLanes to road points."""
     # Near adds NEAR_FID and NEAR_DIST to roadPoints
     nearTime = time()
     arcpy.Near_analysis(roadPoints.path, bikeLanes.path, nearSearchRadius)
+    pointCount = int(arcpy.GetCount_management(roadPoints.path).getOutput(0))
+    recordRows(rowsIn=pointCount, rowsOut=pointCount)
     print 'joinPointsAndBikelanes-Near: {}'.format(time() - nearTime)
 
 
-def createTriPointFeature(lineLayer):
+def iterLineFeatures(featurePath):
+    """Generate (oid, [[(x, y), ...], ...]) for every line feature."""
+    with arcpy.da.SearchCursor(featurePath, ['OID@', 'SHAPE@']) as cursor:
+        for oid, line in cursor:
+            yield oid, [[(p.X, p.Y) for p in part if p is not None] for part in line or []]
+
+
+def readLineArrays(featurePath):
+    """Read line vertices into flat coordinate arrays."""
+    return LineArrays.fromParts(iterLineFeatures(featurePath))
+
+
+def checkSpatialReferences(roads, bikeLanes):
+    """Raise ValueError when roads and bike lanes are not in the same coordinate system.
+
+    Vertices are read in the coordinate system they are stored in, unlike Near_analysis the numpy engine does
+    not project. LineArrays roads are not checked, selectRoadsNearBikeLanes checked the dataset they came from."""
+    if isinstance(roads, LineArrays):
+        return
+    roadsReference = arcpy.Describe(roads).spatialReference
+    lanesReference = arcpy.Describe(bikeLanes).spatialReference
+    if (roadsReference.factoryCode, roadsReference.name) != (lanesReference.factoryCode, lanesReference.name):
+        raise ValueError('Roads are in {} and bike lanes are in {}, project one of them first'.format(
+            roadsReference.name, lanesReference.name))
+
+
+def contentChecksum(featurePath, fields=[]):
+    """Hash the OID, length, centroid and fields of every feature without building geometry objects.
+
+    The centroid catches a feature moved without changing its length."""
+    checksum = hashlib.sha1()
+    with arcpy.da.SearchCursor(featurePath, ['OID@', 'SHAPE@LENGTH', 'SHAPE@XY'] + fields) as cursor:
+        for row in sorted(cursor):
+            checksum.update(repr(row).encode('utf-8'))
+    return checksum.hexdigest()
+
+
+def datasetFingerprint(featurePath, fields=[]):
+    """Identify the current version of a dataset.
+
+    Datasets with editor tracking are identified by their last edit date. Other datasets are read for a content
+    checksum, so vertex and attribute edits that keep the count and extent are not missed."""
+    description = arcpy.Describe(featurePath)
+    version = None
+    editedAtField = getattr(description, 'editedAtFieldName', '')
+    if editedAtField:
+        # One row sorted on the server gives the last edit date, NULLs sort first on some databases.
+        with arcpy.da.SearchCursor(featurePath, [editedAtField],
+                                   where_clause='{} IS NOT NULL'.format(editedAtField),
+                                   sql_clause=(None, 'ORDER BY {} DESC'.format(editedAtField))) as cursor:
+            for row in cursor:
+                version = str(row[0])
+                break
+    else:
+        version = contentChecksum(featurePath, sorted(fields))
+
+    return fingerprint(description.catalogPath,
+                       sorted(fields),
+                       arcpy.GetCount_management(featurePath).getOutput(0),
+                       str(description.extent),
+                       version)
+
+
+def readCachedLineArrays(featurePath, fields=[], key=None):
+    """Get (LineArrays, {field: column}) from the local cache, reading the dataset only when it has changed.
+
+    key is the datasetFingerprint of featurePath and fields when the caller already has it."""
+    datasetCache = DatasetCache(Configs.cacheDirectory, Configs.cacheMaxBytes)
+    if key is None:
+        key = datasetFingerprint(featurePath, fields)
+    cached = datasetCache.get(key)
+    if cached is not None:
+        return cached
+
+    features = []
+    attributes = dict((field, []) for field in fields)
+    with arcpy.da.SearchCursor(featurePath, ['OID@', 'SHAPE@'] + fields) as cursor:
+        for row in cursor:
+            oid, line = row[:2]
+            features.append((oid, [[(p.X, p.Y) for p in part if p is not None] for part in line or []]))
+            for field, value in zip(fields, row[2:]):
+                attributes[field].append(value)
+
+    datasetCache.put(key, LineArrays.fromParts(features), attributes)
+    return datasetCache.get(key)
+
+
+def asLineArrays(lines):
+    """Read a layer or feature class path into LineArrays, LineArrays are returned unchanged."""
+    if isinstance(lines, LineArrays):
+        return lines
+    return readLineArrays(lines)
+
+
+@instrumented('near-numpy')
+def nearPointsAndBikelanesNumpy(roadPoints, bikeLanes, nearSearchRadius):
+    """Drop in replacement for nearPointsAndBikelanes that uses a grid index instead of Near_analysis."""
+    # Adds the same NEAR_FID and NEAR_DIST fields to roadPoints
+    nearTime = time()
+    checkSpatialReferences(roadPoints.path, bikeLanes.path)
+    points = arcpy.da.FeatureClassToNumPyArray(roadPoints.path, ['OID@', 'SHAPE@X', 'SHAPE@Y'])
+    bikeLaneIndex = SegmentIndex(readLineArrays(bikeLanes.path), minCellSize=float(nearSearchRadius))
+    nearFids, nearDists = bikeLaneIndex.nearest(points['SHAPE@X'], points['SHAPE@Y'], float(nearSearchRadius))
+
+    nearTable = numpy.empty(len(points), dtype=[('PointId', 'i4'), ('NEAR_FID', 'i4'), ('NEAR_DIST', 'f8')])
+    nearTable['PointId'] = points['OID@']
+    nearTable['NEAR_FID'] = nearFids
+    nearTable['NEAR_DIST'] = nearDists
+    arcpy.da.ExtendTable(roadPoints.path, roadPoints.ObjectIdField, nearTable, 'PointId', append_only=False)
+    recordRows(rowsIn=len(points), rowsOut=len(points))
+    print 'joinPointsAndBikelanes-NearNumpy: {}'.format(time() - nearTime)
+
+
+def createTriPointArrays(lineLayer, sampleCount=3):
+    """Get a (LineId, LinePos, x, y) array of sampleCount points along each line."""
+    return readLineArrays(lineLayer).samplePoints(sampleCount)
+
+
+@instrumented('tri-point')
+def createTriPointFeature(lineLayer, sampleCount=3, batched=False):
     """Create a feature class of first last and mid points for each line."""
+    spatialReference = arcpy.Describe(lineLayer).spatialReference
+    if batched:
+        # All points are computed in one vectorized pass and written in one call.
+        triPointPath = os.path.join(Configs.getTempWorkspace(), 'roadTriPoint')
+        points = createTriPointArrays(lineLayer, sampleCount)
+        arcpy.da.NumPyArrayToFeatureClass(points,
+                                          triPointPath,
+                                          ('x', 'y'),
+                                          spatialReference)
+        recordRows(rowsIn=len(points) // sampleCount, rowsOut=len(points))
+        return Feature(Configs.getTempWorkspace(), 'roadTriPoint', spatialReference)
+
     triPointFields = [('LineId', 'LONG'),
                       ('LinePos', 'FLOAT'),
                       ('SHAPE@', 'geometery')]
-    triPoint = Feature.createFeature(Configs.tempWorkspace,
+    triPoint = Feature.createFeature(Configs.getTempWorkspace(),
                                      'roadTriPoint',
-                                     arcpy.Describe(lineLayer).spatialReference,
+                                     spatialReference,
                                      'POINT',
                                      triPointFields)
 
+    linePositions = numpy.linspace(0.0, 1.0, sampleCount).tolist()
+    lineCount = 0
     triCursor = arcpy.da.InsertCursor(triPoint.path,
                                       [x[0] for x in triPointFields])
     with arcpy.da.SearchCursor(lineLayer, ['OID@', 'SHAPE@']) as cursor:
         for row in cursor:
             oid, line = row
-            triCursor.insertRow((oid,
-                                 0,
-                                 arcpy.PointGeometry(line.firstPoint,
-                                                     triPoint.spatialReference)))
-            triCursor.insertRow((oid,
-                                 1,
-                                 arcpy.PointGeometry(line.lastPoint,
-                                                     triPoint.spatialReference)))
-            triCursor.insertRow((oid,
-                                 0.5,
-                                 line.positionAlongLine(0.5, True)))
+            lineCount += 1
+            for linePos in linePositions:
+                if linePos == 0:
+                    point = arcpy.PointGeometry(line.firstPoint, triPoint.spatialReference)
+                elif linePos == 1:
+                    point = arcpy.PointGeometry(line.lastPoint, triPoint.spatialReference)
+                else:
+                    point = line.positionAlongLine(linePos, True)
+                triCursor.insertRow((oid, linePos, point))
 
     del triCursor
+    recordRows(rowsIn=lineCount, rowsOut=lineCount * sampleCount)
 
     return triPoint
 
@@ -236,27 +361,256 @@ def createRoadSubset(fullSgid, bikeLanes):
                                            bikeLanes.path,
                                            distFromBikeLanes)
 
-    return Feature.createFeatureFromLayer(Configs.tempWorkspace,
+    return Feature.createFeatureFromLayer(Configs.getTempWorkspace(),
                                           'RoadsWithin{}'.format(distFromBikeLanes),
                                           subsetLayer)
 
 
-def getRoadCoverageTable(subsetLayer, bikeLanes, distFromBikeLanes):
+@instrumented('subset')
+def selectRoadsNearBikeLanes(roadsPath, bikeLanes, distFromBikeLanes, useCache=False):
+    """Stream roads through the bike lane index and keep roads within distFromBikeLanes in memory.
+
+    With useCache roads come from the memory mapped snapshot in Configs.cacheDirectory."""
+    checkSpatialReferences(roadsPath, bikeLanes.path)
+    bikeLaneIndex = SegmentIndex(readLineArrays(bikeLanes.path), minCellSize=distFromBikeLanes)
+    if useCache:
+        roads = readCachedLineArrays(roadsPath)[0]
+        subsetRoads = roads.take(numpy.flatnonzero(bikeLaneIndex.linesWithin(roads, distFromBikeLanes)))
+        recordRows(rowsIn=len(roads), rowsOut=len(subsetRoads))
+        return subsetRoads
+    subsetRoads = LineArrays.fromParts(iterLinesNear(iterLineFeatures(roadsPath), bikeLaneIndex, distFromBikeLanes))
+    recordRows(rowsOut=len(subsetRoads))
+    return subsetRoads
+
+
+@instrumented('road-coverage-rows')
+def getRoadCoverageRows(subsetLayer, bikeLanes, distFromBikeLanes, sampleCount=3, processes=None, exact=False,
+                        nearestCount=1):
+    """Generate coverage rows with the numpy pipeline without writing intermediate feature classes.
+
+    When exact is True Precent is the measured fraction of each road within distFromBikeLanes of each lane.
+    nearestCount is the number of closest bike lanes each sample point adds coverage to."""
+    checkSpatialReferences(subsetLayer, bikeLanes.path)
+    roads = asLineArrays(subsetLayer)
+    lanes = readLineArrays(bikeLanes.path)
+    if Configs.keepIntermediates:
+        # Debug copy, the coverage is computed from the arrays
+        arcpy.da.NumPyArrayToFeatureClass(roads.samplePoints(sampleCount),
+                                          os.path.join(Configs.getTempWorkspace(), 'roadTriPoint'),
+                                          ('x', 'y'),
+                                          arcpy.Describe(bikeLanes.path).spatialReference)
+    if processes is None:
+        coverage = roadCoverageArrays(roads, lanes, distFromBikeLanes, sampleCount, exact, nearestCount)
+    else:
+        coverage = tiledRoadCoverageArrays(roads, lanes, distFromBikeLanes, sampleCount, processes=processes,
+                                           exact=exact, nearestCount=nearestCount)
+    recordRows(rowsIn=len(roads), rowsOut=len(coverage))
+    return iterCoverageArrayRows(coverage)
+
+
+@instrumented('pipelined-coverage')
+def createPipelinedCoverageTable(roadsPath, bikeLanes, distFromBikeLanes, sampleCount=3, exact=False, nearestCount=1,
+                                 workers=2):
+    """Stream roads through the subset, tri-point, near and coverage steps while the coverage table is written.
+
+    Replaces selectRoadsNearBikeLanes followed by getRoadCoverageTable. Reading, compute and writing overlap,
+    rows are written in the order roads are read."""
+    checkSpatialReferences(roadsPath, bikeLanes.path)
+    coverageTime = time()
+    coverages = pipelinedRoadCoverageArrays(iterLineFeatures(roadsPath), readLineArrays(bikeLanes.path),
+                                            distFromBikeLanes, sampleCount, exact, nearestCount, workers=workers)
+    roadCoverageTable = createCoverageTable(row for coverage in coverages for row in iterCoverageArrayRows(coverage))
+    print 'Created pipelined line coverage table: {}'.format(round(time() - coverageTime, 3))
+    return roadCoverageTable
+
+
+@instrumented('road-preprocessing')
+def readRoadPreprocessing(roadsPath, sampleCount=3, distFromBikeLanes=1.0):
+    """Get road sample points and segment index, built once per road dataset version, sampleCount and distance.
+
+    Later calls in the same process and later runs against unchanged roads reuse the first result."""
+    roadsVersion = datasetFingerprint(roadsPath)  # Computing it can read the whole table
+    key = fingerprint(roadsVersion, 'roadPreprocessing', sampleCount, float(distFromBikeLanes))
+    return RoadPreprocessing.get(key,
+                                 lambda: readCachedLineArrays(roadsPath, key=roadsVersion)[0],
+                                 sampleCount,
+                                 DatasetCache(Configs.cacheDirectory, Configs.cacheMaxBytes),
+                                 distFromBikeLanes)
+
+
+@instrumented('shared-road-coverage-rows')
+def getSharedRoadCoverageRows(roadsPath, bikeLanes, distFromBikeLanes, sampleCount=3, exact=False):
+    """Generate coverage rows for all roads near bikeLanes using road preprocessing shared between bike lane layers.
+
+    Replaces selectRoadsNearBikeLanes followed by getRoadCoverageRows."""
+    checkSpatialReferences(roadsPath, bikeLanes.path)
+    preprocessed = readRoadPreprocessing(roadsPath, sampleCount, distFromBikeLanes)
+    coverage = preprocessed.coverageArrays(readLineArrays(bikeLanes.path), distFromBikeLanes, exact)
+    recordRows(rowsIn=len(preprocessed.roads), rowsOut=len(coverage))
+    return iterCoverageArrayRows(coverage)
+
+
+@instrumented('road-coverage-table')
+def getRoadCoverageTable(subsetLayer, bikeLanes, distFromBikeLanes, nearEngine='numpy', sampleCount=3, processes=None,
+                         exact=False, nearestCount=1):
+    """Create the coverage table. nearEngine is 'numpy' for the grid index or 'arcpy' for Near_analysis.
+
+    The numpy engine keeps intermediates in memory. The arcpy engine writes tri-points to the temp workspace, so
+    subsetLayer must be a layer or feature class and processes, exact and nearestCount are not supported.
+    When processes is set the numpy pipeline is run on spatial tiles in a process pool."""
+    if nearEngine == 'numpy':
+        coverageTime = time()
+        roadCoverageTable = createCoverageTable(getRoadCoverageRows(subsetLayer, bikeLanes, distFromBikeLanes,
+                                                                    sampleCount, processes, exact, nearestCount))
+        print 'Created line coverage table in memory: {}'.format(round(time() - coverageTime, 3))
+        return roadCoverageTable
+    if nearEngine != 'arcpy':
+        raise ValueError('Unknown nearEngine {}'.format(nearEngine))
+    if isinstance(subsetLayer, LineArrays) or processes is not None or exact or nearestCount != 1:
+        raise ValueError('nearEngine arcpy needs a feature layer and no processes, exact or nearestCount')
+
     triPointTime = time()
-    triPoint = createTriPointFeature(subsetLayer)
-    print 'Created 3 points along subset roads: {}'.format(round(time() - triPointTime, 3))
+    triPoint = createTriPointFeature(subsetLayer, sampleCount)
+    print 'Created {} points along subset roads: {}'.format(sampleCount, round(time() - triPointTime, 3))
 
     joinNearTime = time()
     nearPointsAndBikelanes(triPoint, bikeLanes, distFromBikeLanes)
     print 'Joined bikeLane fields to road points: {}'.format(round(time() - joinNearTime, 3))
 
     coverageTime = time()
-    roadCoverageTable = createBikeLaneRoadCoverage(triPoint)
+    roadCoverageTable = createBikeLaneRoadCoverage(triPoint, sampleCount)
     print 'Created line coverage table: {}'.format(round(time() - coverageTime, 3))
 
     return roadCoverageTable
 
 
+def coverageManifestPath(bikeLanes, tableName):
+    """Get the manifest path for incremental runs of one bike lane dataset into one coverage table."""
+    return os.path.join(Configs.manifestDirectory,
+                        '{}_{}.json'.format(tableName,
+                                            fingerprint(arcpy.Describe(bikeLanes.path).catalogPath, tableName)[:12]))
+
+
+@instrumented('incremental-update')
+def updateRoadCoverageTable(subsetLayer, bikeLanes, distFromBikeLanes, sampleCount=3, tableName=None,
+                            bikeLaneFields=[], translator=None, translationFields=[]):
+    """Patch the coverage table from the last run of bikeLanes with rows for only the roads affected by edits.
+
+    tableName defaults to LineCoverage_<bike lane name>, and a manifest is kept for each bike lane dataset and
+    table. With a translator, rows are joined and translated like createJoinedCoverageTable and attribute edits
+    to a bike lane also recompute the roads it covers."""
+    if Configs.outputFormat != 'gdb':
+        raise ValueError('Incremental updates patch a gdb table, outputFormat is {}'.format(Configs.outputFormat))
+    updateTime = time()
+    if tableName is None:
+        tableName = 'LineCoverage_' + bikeLanes.name
+    checkSpatialReferences(subsetLayer, bikeLanes.path)
+    roads = asLineArrays(subsetLayer)
+    lanes = readLineArrays(bikeLanes.path)
+    laneAttributes = readLaneAttributes(bikeLanes, bikeLaneFields) if translator is not None else None
+    roadHashes = geometryHashes(roads)
+    laneHashes = geometryHashes(lanes, laneAttributes)
+    fieldNames = [f[0] for f in coverageFields]
+    if translator is not None:
+        fieldNames += joinedFields(bikeLaneFields, translator)
+
+    manifestPath = coverageManifestPath(bikeLanes, tableName)
+    manifest = RunManifest.load(manifestPath)
+    if (manifest is None or not manifest.matchesSettings(distFromBikeLanes, sampleCount, fieldNames) or
+            not arcpy.Exists(manifest.coverageTablePath)):
+        tablePath = os.path.join(Configs.outputWorkspace, tableName)
+        if arcpy.Exists(tablePath):
+            arcpy.Delete_management(tablePath)
+        coverageRows = iterCoverageArrayRows(roadCoverageArrays(roads, lanes, distFromBikeLanes, sampleCount))
+        if translator is None:
+            roadCoverageTable = createCoverageTable(coverageRows, tableName=tableName)
+        else:
+            roadCoverageTable = createJoinedCoverageTable(coverageRows, bikeLanes, bikeLaneFields, translator,
+                                                          translationFields, tableName)
+        RunManifest(roadHashes, laneHashes, roadCoverageTable.path, distFromBikeLanes, sampleCount, fieldNames).save(
+            manifestPath)
+        print 'Created full line coverage table: {}'.format(round(time() - updateTime, 3))
+        return roadCoverageTable
+
+    with arcpy.da.SearchCursor(manifest.coverageTablePath, ['LineId', 'CoverId']) as cursor:
+        affected = affectedRoadIds(roads,
+                                   lanes,
+                                   diffHashes(manifest.roadHashes, roadHashes),
+                                   diffHashes(manifest.laneHashes, laneHashes),
+                                   cursor,
+                                   distFromBikeLanes)
+
+    coverage = roadCoverageArrays(roads.take(numpy.flatnonzero(isIn(roads.ids, list(affected)))),
+                                  lanes,
+                                  distFromBikeLanes,
+                                  sampleCount)
+    coverageRows = iterCoverageArrayRows(coverage)
+    if translator is not None:
+        coverageRows = iterJoinedRows(coverageRows, laneAttributes, bikeLaneFields, translator)
+    with arcpy.da.UpdateCursor(manifest.coverageTablePath, ['LineId']) as cursor:
+        for row in cursor:
+            if row[0] in affected:
+                cursor.deleteRow()
+    tableCursor = arcpy.da.InsertCursor(manifest.coverageTablePath, fieldNames)
+    for lcRow in coverageRows:
+        tableCursor.insertRow(lcRow)
+    del tableCursor
+
+    manifest.roadHashes = roadHashes
+    manifest.laneHashes = laneHashes
+    manifest.save(manifestPath)
+    print 'Updated {} roads in line coverage table: {}'.format(len(affected), round(time() - updateTime, 3))
+    return Table(os.path.dirname(manifest.coverageTablePath), os.path.basename(manifest.coverageTablePath))
+
+
+def readLaneAttributes(bikeLanes, bikeLaneFields):
+    """Get a {bikeLaneOid: (bikeLaneFields values)} dict."""
+    laneAttributes = {}
+    with arcpy.da.SearchCursor(bikeLanes.path, ['OID@'] + bikeLaneFields) as cursor:
+        for row in cursor:
+            laneAttributes[row[0]] = row[1:]
+    return laneAttributes
+
+
+@instrumented('join-translate')
+def createJoinedCoverageTable(coverageRows, bikeLanes, bikeLaneFields, translator, translationFields, tableName=None):
+    """Create the LineCoverage table with bike lane fields joined and translated in memory in a single write.
+
+    translationFields are (name, type, length) for translator outputs that are not bike lane fields."""
+    fieldTypes = {'String': 'TEXT', 'Double': 'DOUBLE', 'Single': 'FLOAT', 'Integer': 'LONG',
+                  'SmallInteger': 'SHORT', 'Date': 'DATE'}
+    laneFields = dict((f.name, (f.name, fieldTypes[f.type], f.length)) for f in arcpy.ListFields(bikeLanes.path)
+                      if f.name in bikeLaneFields)
+    outputFields = dict((f[0], f) for f in translationFields)
+    extraFields = [laneFields[f] if f in laneFields else outputFields[f]
+                   for f in joinedFields(bikeLaneFields, translator)]
+
+    return createCoverageTable(iterJoinedRows(coverageRows, readLaneAttributes(bikeLanes, bikeLaneFields),
+                                              bikeLaneFields, translator),
+                               extraFields,
+                               tableName)
+
+
+def recordCoverageFixture(coverageTable, fixturePath, roadsPath, bikeLanes, distFromBikeLanes, sampleCount, seconds):
+    """Save a coverage table as a compare.py baseline with cache snapshots of the roads and bike lanes it used.
+
+    Copy the fixture and the cache directory to compare engines against this run without arcpy."""
+    roadsVersion = datasetFingerprint(roadsPath)
+    bikeLanesVersion = datasetFingerprint(bikeLanes.path)
+    readCachedLineArrays(roadsPath, key=roadsVersion)
+    readCachedLineArrays(bikeLanes.path, key=bikeLanesVersion)
+    with arcpy.da.SearchCursor(coverageTable.path, [f[0] for f in coverageFields]) as cursor:
+        rows = [list(row) for row in cursor]
+    saveFixture(fixturePath,
+                rows,
+                {'cache': Configs.cacheDirectory,
+                 'roads': roadsVersion,
+                 'bikeLanes': bikeLanesVersion,
+                 'distFromBikeLanes': distFromBikeLanes,
+                 'sampleCount': sampleCount},
+                seconds)
+
+
 if __name__ == '__main__':
     totalTime = time()
     Configs.setupWorkspace(r'C:\GisWork\LineCoverage')
@@ -281,25 +635,10 @@ if __name__ == '__main__':
 
     distFromBikeLanes = 12  # distance to limit the road layer. Chosen after exploratory analysis.
     # Select road within a distance from bike lanes.
-    subsetLayer = 'roadsCloseToBikeLanes'
     selectTime = time()
-    arcpy.MakeFeatureLayer_management(fullSgidRoads.path, subsetLayer)
-    arcpy.SelectLayerByLocation_management(subsetLayer,
-                                           'WITHIN_A_DISTANCE',
-                                           bikeLanes.path,
-                                           distFromBikeLanes)
+    subsetRoads = selectRoadsNearBikeLanes(fullSgidRoads.path, bikeLanes, distFromBikeLanes)
     print 'Created subset of SGID roads: {}'.format(round(time() - selectTime, 3))
 
-    triPointTime = time()
-    triPoint = createTriPointFeature(subsetLayer)
-    print 'Created 3 points along subset roads: {}'.format(round(time() - triPointTime, 3))
-
-    joinNearTime = time()
-    nearPointsAndBikelanes(triPoint, bikeLanes, distFromBikeLanes)
-    print 'Joined bikeLane fields to road points: {}'.format(round(time() - joinNearTime, 3))
-
-    coverageTime = time()
-    roadCoverageTable = createBikeLaneRoadCoverage(triPoint)
-    print 'Created line coverage table: {}'.format(round(time() - coverageTime, 3))
+    roadCoverageTable = getRoadCoverageTable(subsetRoads, bikeLanes, distFromBikeLanes)
 
     print 'Completed: {}'.format(round(time() - totalTime, 3))
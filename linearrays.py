@@ -0,0 +1,192 @@
+"""Columnar vertex arrays for line features. Does not require arcpy."""
+import numpy as np
+
+
+def expandRanges(starts, counts):
+    """Get the concatenation of arange(start, start + count) for each pair and its owner index."""
+    owner = np.repeat(np.arange(len(counts)), counts)
+    firsts = np.cumsum(counts) - counts
+    return owner, np.repeat(starts, counts) + (np.arange(counts.sum()) - np.repeat(firsts, counts))
+
+
+def filled(shape, value, dtype=np.float64):
+    """Get a new array of shape with every element set to value, np.full needs numpy 1.8."""
+    array = np.empty(shape, dtype=dtype)
+    array.fill(value)
+    return array
+
+
+def isIn(values, testValues):
+    """Get a mask of the values that are in testValues, np.isin needs numpy 1.13 and np.in1d is gone in numpy 2.4."""
+    values = np.asarray(values)
+    testValues = np.unique(np.asarray(testValues))
+    if len(testValues) == 0:
+        return np.zeros(values.shape, dtype=bool)
+    positions = np.minimum(np.searchsorted(testValues, values), len(testValues) - 1)
+    return testValues[positions] == values
+
+
+class LineArrays(object):
+    """Store line features as flat coordinate arrays with offsets."""
+
+    def __init__(self, ids, partOffsets, vertexOffsets, x, y):
+        """constructor."""
+        self.ids = np.asarray(ids, dtype=np.int64)
+        # Parts of feature i are partOffsets[i]:partOffsets[i + 1]
+        self.partOffsets = np.asarray(partOffsets, dtype=np.int64)
+        # Vertices of part j are vertexOffsets[j]:vertexOffsets[j + 1]
+        self.vertexOffsets = np.asarray(vertexOffsets, dtype=np.int64)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+
+    def __len__(self):
+        """Number of features."""
+        return len(self.ids)
+
+    @staticmethod
+    def fromParts(features):
+        """Create from an iterable of (id, [[(x, y), ...], ...]) features."""
+        ids = []
+        partOffsets = [0]
+        vertexOffsets = [0]
+        x = []
+        y = []
+        for featureId, parts in features:
+            ids.append(featureId)
+            for part in parts:
+                if len(part) == 0:
+                    continue
+                for pointX, pointY in part:
+                    x.append(pointX)
+                    y.append(pointY)
+                vertexOffsets.append(len(x))
+            partOffsets.append(len(vertexOffsets) - 1)
+
+        return LineArrays(ids, partOffsets, vertexOffsets, x, y)
+
+    @staticmethod
+    def concat(lineSets):
+        """Create one LineArrays with the features of every LineArrays in order, ids are kept."""
+        partOffsets = [np.zeros(1, dtype=np.int64)]
+        vertexOffsets = [np.zeros(1, dtype=np.int64)]
+        partCount = 0
+        vertexCount = 0
+        for lines in lineSets:
+            partOffsets.append(lines.partOffsets[1:] + partCount)
+            vertexOffsets.append(lines.vertexOffsets[1:] + vertexCount)
+            partCount += lines.partOffsets[-1]
+            vertexCount += lines.vertexOffsets[-1]
+        return LineArrays(np.concatenate([np.zeros(0, dtype=np.int64)] + [lines.ids for lines in lineSets]),
+                          np.concatenate(partOffsets),
+                          np.concatenate(vertexOffsets),
+                          np.concatenate([np.zeros(0)] + [lines.x for lines in lineSets]),
+                          np.concatenate([np.zeros(0)] + [lines.y for lines in lineSets]))
+
+    def take(self, features):
+        """Get a new LineArrays with only the features at the given indexes."""
+        features = np.asarray(features, dtype=np.int64)
+        partStarts = self.partOffsets[features]
+        partCounts = self.partOffsets[features + 1] - partStarts
+        parts = expandRanges(partStarts, partCounts)[1]
+        vertexStarts = self.vertexOffsets[parts]
+        vertexCounts = self.vertexOffsets[parts + 1] - vertexStarts
+        vertices = expandRanges(vertexStarts, vertexCounts)[1]
+        return LineArrays(self.ids[features],
+                          np.concatenate([[0], np.cumsum(partCounts)]),
+                          np.concatenate([[0], np.cumsum(vertexCounts)]),
+                          self.x[vertices],
+                          self.y[vertices])
+
+    def bounds(self):
+        """Get (minX, minY, maxX, maxY) arrays for every feature, nan for null geometries."""
+        starts = self.vertexOffsets[self.partOffsets[:-1]]
+        hasVertices = self.vertexOffsets[self.partOffsets[1:]] > starts
+        bounds = []
+        for values, reduction in ((self.x, np.minimum), (self.y, np.minimum),
+                                  (self.x, np.maximum), (self.y, np.maximum)):
+            bound = filled(len(self), np.nan)
+            if hasVertices.any():
+                bound[hasVertices] = reduction.reduceat(values, starts[hasVertices])
+            bounds.append(bound)
+        return tuple(bounds)
+
+    def partFeatureIndex(self):
+        """Get the feature index of every part."""
+        return np.repeat(np.arange(len(self.ids)), np.diff(self.partOffsets))
+
+    def vertexPartIndex(self):
+        """Get the part index of every vertex."""
+        return np.repeat(np.arange(len(self.vertexOffsets) - 1), np.diff(self.vertexOffsets))
+
+    def segmentStarts(self):
+        """Get the vertex index of the first vertex of every segment."""
+        isStart = np.ones(len(self.x), dtype=bool)
+        if len(self.x) > 0:
+            isStart[self.vertexOffsets[1:] - 1] = False  # Last vertex of each part
+        return np.flatnonzero(isStart)
+
+    def segments(self):
+        """Get (featureIndex, x0, y0, x1, y1) arrays for every segment."""
+        starts = self.segmentStarts()
+        featureIndex = self.partFeatureIndex()[self.vertexPartIndex()[starts]]
+        return (featureIndex,
+                self.x[starts],
+                self.y[starts],
+                self.x[starts + 1],
+                self.y[starts + 1])
+
+    def segmentMeasures(self):
+        """Get (featureIndex, measure, length) for every segment, measure is the length along the feature before it."""
+        featureIndex, x0, y0, x1, y1 = self.segments()
+        length = np.hypot(x1 - x0, y1 - y0)
+        cumulativeStart = np.cumsum(length) - length
+        # Segments are ordered by feature, so each feature's first segment is found with a sorted search.
+        firstSegment = np.searchsorted(featureIndex, featureIndex, 'left')
+        return featureIndex, cumulativeStart - cumulativeStart[firstSegment], length
+
+    def samplePoints(self, count=3):
+        """Get a (LineId, LinePos, x, y) array of count evenly spaced points along every line."""
+        positions = np.linspace(0.0, 1.0, count)
+        features = np.flatnonzero(np.diff(self.partOffsets) > 0)  # Skip null geometries
+        firstVertex = self.vertexOffsets[self.partOffsets[features]]
+        lastVertex = self.vertexOffsets[self.partOffsets[features + 1]] - 1
+
+        segmentFeature, x0, y0, x1, y1 = self.segments()
+        segmentLength = np.hypot(x1 - x0, y1 - y0)
+        cumulativeEnd = np.cumsum(segmentLength)
+        cumulativeStart = cumulativeEnd - segmentLength
+        firstSegment = np.searchsorted(segmentFeature, features, 'left')
+        lastSegment = np.searchsorted(segmentFeature, features, 'right') - 1
+        hasSegments = lastSegment >= firstSegment
+        safeFirst = np.where(hasSegments, firstSegment, 0)
+        safeLast = np.where(hasSegments, lastSegment, 0)
+
+        points = np.empty(len(features) * count, dtype=[('LineId', 'i4'),
+                                                         ('LinePos', 'f8'),
+                                                         ('x', 'f8'),
+                                                         ('y', 'f8')])
+        sample = np.repeat(np.arange(len(features)), count)
+        fraction = np.tile(positions, len(features))
+        points['LineId'] = self.ids[features][sample]
+        points['LinePos'] = fraction
+        # Start at the first vertex so lines without segments and the 0 position are exact.
+        points['x'] = self.x[firstVertex][sample]
+        points['y'] = self.y[firstVertex][sample]
+
+        if len(segmentLength) > 0:
+            lineStart = cumulativeStart[safeFirst][sample]
+            lineLength = cumulativeEnd[safeLast][sample] - lineStart
+            target = lineStart + fraction * lineLength
+            segment = np.clip(np.searchsorted(cumulativeEnd, target, 'left'),
+                              safeFirst[sample],
+                              safeLast[sample])
+            length = segmentLength[segment]
+            t = np.clip((target - cumulativeStart[segment]) / np.where(length > 0, length, 1.0), 0.0, 1.0)
+            interpolate = hasSegments[sample]
+            points['x'] = np.where(interpolate, x0[segment] + t * (x1[segment] - x0[segment]), points['x'])
+            points['y'] = np.where(interpolate, y0[segment] + t * (y1[segment] - y0[segment]), points['y'])
+
+        isLast = fraction == 1.0
+        points['x'][isLast] = self.x[lastVertex][sample[isLast]]
+        points['y'][isLast] = self.y[lastVertex][sample[isLast]]
+        return points
@@ -0,0 +1,103 @@
+"""Persist per feature geometry hashes between runs to find what changed. Does not require arcpy."""
+import hashlib
+import json
+import numpy as np
+import os
+from linearrays import isIn
+from nearest import SegmentIndex
+
+
+def geometryHashes(lines, attributes=None):
+    """Get a {featureId: sha1} dict of every feature's vertices.
+
+    attributes is an optional {featureId: (values)} dict of attributes hashed with the vertices."""
+    hashes = {}
+    for i, featureId in enumerate(lines.ids.tolist()):
+        partStart, partEnd = lines.partOffsets[i], lines.partOffsets[i + 1]
+        vertexOffsets = lines.vertexOffsets[partStart:partEnd + 1]
+        # Arrays are hashed through the buffer interface, ndarray.tobytes needs numpy 1.9.
+        featureHash = hashlib.sha1((vertexOffsets - vertexOffsets[0]).astype('<i8'))
+        featureHash.update(lines.x[vertexOffsets[0]:vertexOffsets[-1]].astype('<f8'))
+        featureHash.update(lines.y[vertexOffsets[0]:vertexOffsets[-1]].astype('<f8'))
+        if attributes is not None:
+            featureHash.update(json.dumps(list(attributes.get(featureId, ())), default=str).encode('utf-8'))
+        hashes[featureId] = featureHash.hexdigest()
+    return hashes
+
+
+def diffHashes(oldHashes, newHashes):
+    """Get (added, changed, removed) sets of feature ids."""
+    added = set(newHashes) - set(oldHashes)
+    removed = set(oldHashes) - set(newHashes)
+    changed = set(i for i in newHashes if i in oldHashes and newHashes[i] != oldHashes[i])
+    return added, changed, removed
+
+
+def affectedRoadIds(roads, bikeLanes, roadDiff, laneDiff, previousCoverage, distFromBikeLanes):
+    """Get the ids of roads whose coverage rows must be recomputed.
+
+    roadDiff and laneDiff are diffHashes results. previousCoverage is an iterable of (LineId, CoverId) rows.
+    """
+    roadAdded, roadChanged, roadRemoved = roadDiff
+    laneAdded, laneChanged, laneRemoved = laneDiff
+    affected = roadAdded | roadChanged | roadRemoved
+
+    # Roads that were covered by the old geometry of a lane
+    oldLaneIds = laneChanged | laneRemoved
+    affected.update(lineId for lineId, coverId in previousCoverage if coverId in oldLaneIds)
+
+    # Roads near the new geometry of a lane
+    newLaneIds = laneAdded | laneChanged
+    if newLaneIds:
+        newLanes = bikeLanes.take(np.flatnonzero(isIn(bikeLanes.ids, list(newLaneIds))))
+        nearNewLanes = SegmentIndex(newLanes, minCellSize=distFromBikeLanes).linesWithin(roads, distFromBikeLanes)
+        affected.update(roads.ids[nearNewLanes].tolist())
+
+    return affected
+
+
+class RunManifest(object):
+    """Geometry hashes and settings saved by the last run."""
+
+    def __init__(self, roadHashes, laneHashes, coverageTablePath, distFromBikeLanes, sampleCount, fieldNames):
+        """constructor."""
+        self.roadHashes = roadHashes
+        self.laneHashes = laneHashes
+        self.coverageTablePath = coverageTablePath
+        self.distFromBikeLanes = distFromBikeLanes
+        self.sampleCount = sampleCount
+        self.fieldNames = fieldNames  # Fields of the coverage table, including joined bike lane fields
+
+    def matchesSettings(self, distFromBikeLanes, sampleCount, fieldNames):
+        """Return true when a run with these settings can patch the last run's table."""
+        return (self.distFromBikeLanes == distFromBikeLanes and self.sampleCount == sampleCount and
+                self.fieldNames == list(fieldNames))
+
+    def save(self, manifestPath):
+        """Write the manifest as json."""
+        manifestDirectory = os.path.dirname(manifestPath)
+        if manifestDirectory and not os.path.isdir(manifestDirectory):
+            os.makedirs(manifestDirectory)
+        with open(manifestPath, 'w') as manifestFile:
+            json.dump({'roadHashes': self.roadHashes,
+                       'laneHashes': self.laneHashes,
+                       'coverageTablePath': self.coverageTablePath,
+                       'distFromBikeLanes': self.distFromBikeLanes,
+                       'sampleCount': self.sampleCount,
+                       'fieldNames': self.fieldNames},
+                      manifestFile)
+
+    @staticmethod
+    def load(manifestPath):
+        """Read a manifest, or return None if there is no previous run."""
+        if not os.path.exists(manifestPath):
+            return None
+        with open(manifestPath) as manifestFile:
+            manifest = json.load(manifestFile)
+        # json keys are always strings
+        return RunManifest(dict((int(k), v) for k, v in manifest['roadHashes'].items()),
+                           dict((int(k), v) for k, v in manifest['laneHashes'].items()),
+                           manifest['coverageTablePath'],
+                           manifest['distFromBikeLanes'],
+                           manifest['sampleCount'],
+                           manifest.get('fieldNames'))
@@ -0,0 +1,363 @@
+"""Nearest line segment search over vertex arrays. Does not require arcpy."""
+import numpy as np
+from linearrays import LineArrays, expandRanges, filled
+
+indexArrayNames = ['featureIds', 'x0', 'y0', 'x1', 'y1', '_cellKeys', '_cellSegments']
+
+
+def pointSegmentDistance(px, py, x0, y0, x1, y1):
+    """Vectorized distance from points to line segments."""
+    dx = x1 - x0
+    dy = y1 - y0
+    lengthSq = dx * dx + dy * dy
+    safeLengthSq = np.where(lengthSq > 0, lengthSq, 1.0)
+    t = np.clip(((px - x0) * dx + (py - y0) * dy) / safeLengthSq, 0.0, 1.0)
+    t = np.where(lengthSq > 0, t, 0.0)
+    return np.hypot(px - (x0 + t * dx), py - (y0 + t * dy))
+
+
+def segmentSegmentDistance(ax0, ay0, ax1, ay1, bx0, by0, bx1, by1):
+    """Vectorized distance between pairs of line segments."""
+    distance = np.minimum(np.minimum(pointSegmentDistance(ax0, ay0, bx0, by0, bx1, by1),
+                                     pointSegmentDistance(ax1, ay1, bx0, by0, bx1, by1)),
+                          np.minimum(pointSegmentDistance(bx0, by0, ax0, ay0, ax1, ay1),
+                                     pointSegmentDistance(bx1, by1, ax0, ay0, ax1, ay1)))
+    # Segments that cross have no endpoint on the other segment.
+    side0 = (bx1 - bx0) * (ay0 - by0) - (by1 - by0) * (ax0 - bx0)
+    side1 = (bx1 - bx0) * (ay1 - by0) - (by1 - by0) * (ax1 - bx0)
+    side2 = (ax1 - ax0) * (by0 - ay0) - (ay1 - ay0) * (bx0 - ax0)
+    side3 = (ax1 - ax0) * (by1 - ay0) - (ay1 - ay0) * (bx1 - ax0)
+    crosses = (side0 * side1 < 0) & (side2 * side3 < 0)
+    return np.where(crosses, 0.0, distance)
+
+
+def splitSegments(x0, y0, x1, y1, maxLength):
+    """Split segments into pieces no longer than maxLength, get (segmentIndex, x0, y0, x1, y1) for the pieces."""
+    length = np.hypot(x1 - x0, y1 - y0)
+    counts = np.maximum(np.ceil(length / maxLength), 1).astype(np.int64)
+    segment, piece = expandRanges(np.zeros(len(counts), dtype=np.int64), counts)
+    start = piece / counts[segment].astype(np.float64)
+    end = (piece + 1) / counts[segment].astype(np.float64)
+    last = piece + 1 == counts[segment]  # Ends at the exact end vertex
+    dx = (x1 - x0)[segment]
+    dy = (y1 - y0)[segment]
+    return (segment,
+            x0[segment] + start * dx,
+            y0[segment] + start * dy,
+            np.where(last, x1[segment], x0[segment] + end * dx),
+            np.where(last, y1[segment], y0[segment] + end * dy))
+
+
+def _linearRange(offset, slope, low, high):
+    """Get the (start, end) range of t where low <= offset + slope * t <= high, empty ranges have start > end."""
+    flat = slope == 0
+    safeSlope = np.where(flat, 1.0, slope)
+    t0 = (low - offset) / safeSlope
+    t1 = (high - offset) / safeSlope
+    inside = (offset >= low) & (offset <= high)
+    start = np.where(flat, np.where(inside, -np.inf, np.inf), np.minimum(t0, t1))
+    end = np.where(flat, np.where(inside, np.inf, -np.inf), np.maximum(t0, t1))
+    return start, end
+
+
+def _discRange(px, py, dx, dy, cx, cy, radius):
+    """Get the (start, end) range of t where (px + t * dx, py + t * dy) is within radius of (cx, cy)."""
+    a = dx * dx + dy * dy
+    ox = px - cx
+    oy = py - cy
+    b = dx * ox + dy * oy
+    discriminant = b * b - a * (ox * ox + oy * oy - radius * radius)
+    hit = (a > 0) & (discriminant >= 0)
+    root = np.sqrt(np.where(hit, discriminant, 0.0))
+    safeA = np.where(a > 0, a, 1.0)
+    return np.where(hit, (-b - root) / safeA, np.inf), np.where(hit, (-b + root) / safeA, -np.inf)
+
+
+def segmentCapsuleRange(ax0, ay0, ax1, ay1, bx0, by0, bx1, by1, radius):
+    """Get the (start, end) fraction of each segment a within radius of segment b, start >= end when none is.
+
+    The area within radius of a segment is a convex capsule, two end discs and a slab, so each a segment
+    crosses it in one range that spans the ranges of the three pieces."""
+    dx = ax1 - ax0
+    dy = ay1 - ay0
+    length = np.hypot(bx1 - bx0, by1 - by0)
+    safeLength = np.where(length > 0, length, 1.0)
+    ux = (bx1 - bx0) / safeLength
+    uy = (by1 - by0) / safeLength
+    alongStart, alongEnd = _linearRange((ax0 - bx0) * ux + (ay0 - by0) * uy, dx * ux + dy * uy, 0.0, length)
+    acrossStart, acrossEnd = _linearRange((ay0 - by0) * ux - (ax0 - bx0) * uy, dy * ux - dx * uy, -radius, radius)
+    pieces = [(np.where(length > 0, np.maximum(alongStart, acrossStart), np.inf),
+               np.where(length > 0, np.minimum(alongEnd, acrossEnd), -np.inf)),
+              _discRange(ax0, ay0, dx, dy, bx0, by0, radius),
+              _discRange(ax0, ay0, dx, dy, bx1, by1, radius)]
+
+    start = filled(len(dx), np.inf)
+    end = filled(len(dx), -np.inf)
+    for pieceStart, pieceEnd in pieces:
+        found = pieceStart <= pieceEnd
+        start = np.where(found, np.minimum(start, pieceStart), start)
+        end = np.where(found, np.maximum(end, pieceEnd), end)
+    return np.clip(start, 0.0, 1.0), np.clip(end, 0.0, 1.0)
+
+
+class SegmentIndex(object):
+    """Uniform grid index of line segments for radius limited queries.
+
+    minCellSize should be the query radius, a radius many cells wide makes every query touch many cells."""
+
+    def __init__(self, lines, cellSize=None, minCellSize=1.0):
+        """constructor."""
+        featureIndex, self.x0, self.y0, self.x1, self.y1 = lines.segments()
+        self.featureIds = lines.ids[featureIndex]
+        self.minX = np.minimum(self.x0, self.x1)
+        self.minY = np.minimum(self.y0, self.y1)
+        self.maxX = np.maximum(self.x0, self.x1)
+        self.maxY = np.maximum(self.y0, self.y1)
+
+        if len(self.featureIds) == 0:
+            self.originX = self.originY = 0.0
+            self.cellSize = 1.0
+            self.columns = self.rows = 1
+        else:
+            self.originX = self.minX.min()
+            self.originY = self.minY.min()
+            if cellSize is None:
+                # Most segments should touch only a few cells.
+                extents = np.maximum(self.maxX - self.minX, self.maxY - self.minY)
+                cellSize = max(float(np.median(extents)), float(minCellSize))
+            self.cellSize = float(cellSize)
+            self.columns = int((self.maxX.max() - self.originX) // self.cellSize) + 1
+            self.rows = int((self.maxY.max() - self.originY) // self.cellSize) + 1
+
+        # Long segments are indexed in the cells along them instead of every cell of their envelope.
+        pieceSegments, px0, py0, px1, py1 = splitSegments(self.x0, self.y0, self.x1, self.y1, self.cellSize)
+        pieceIndex, cellKeys = self._cellPairs(np.minimum(px0, px1), np.minimum(py0, py1),
+                                               np.maximum(px0, px1), np.maximum(py0, py1))
+        pairKeys = np.unique(cellKeys * max(len(self.featureIds), 1) + pieceSegments[pieceIndex])
+        self._cellKeys = pairKeys // max(len(self.featureIds), 1)
+        self._cellSegments = pairKeys % max(len(self.featureIds), 1)
+
+    @staticmethod
+    def fromArrays(arrays):
+        """Create from the arrays of toArrays without rebuilding the grid."""
+        index = SegmentIndex.__new__(SegmentIndex)
+        for name in indexArrayNames:
+            setattr(index, name, arrays[name])
+        index.minX = np.minimum(index.x0, index.x1)
+        index.minY = np.minimum(index.y0, index.y1)
+        index.maxX = np.maximum(index.x0, index.x1)
+        index.maxY = np.maximum(index.y0, index.y1)
+        index.originX = float(arrays['originX'][0])
+        index.originY = float(arrays['originY'][0])
+        index.cellSize = float(arrays['cellSize'][0])
+        index.columns = int(arrays['columns'][0])
+        index.rows = int(arrays['rows'][0])
+        return index
+
+    def toArrays(self):
+        """Get a {name: array} dict that fromArrays can recreate the index from."""
+        arrays = dict((name, getattr(self, name)) for name in indexArrayNames)
+        for name in ['originX', 'originY', 'cellSize', 'columns', 'rows']:
+            arrays[name] = np.array([getattr(self, name)])
+        return arrays
+
+    def __len__(self):
+        """Number of segments."""
+        return len(self.featureIds)
+
+    def _cellPairs(self, minX, minY, maxX, maxY):
+        """Get (itemIndex, cellKey) pairs for every grid cell an envelope touches."""
+        firstColumn = np.floor((minX - self.originX) / self.cellSize).astype(np.int64)
+        lastColumn = np.floor((maxX - self.originX) / self.cellSize).astype(np.int64)
+        firstRow = np.floor((minY - self.originY) / self.cellSize).astype(np.int64)
+        lastRow = np.floor((maxY - self.originY) / self.cellSize).astype(np.int64)
+        firstColumn = np.maximum(firstColumn, 0)
+        firstRow = np.maximum(firstRow, 0)
+        lastColumn = np.minimum(lastColumn, self.columns - 1)
+        lastRow = np.minimum(lastRow, self.rows - 1)
+        columnCounts = np.maximum(lastColumn - firstColumn + 1, 0)
+        rowCounts = np.maximum(lastRow - firstRow + 1, 0)
+
+        item, local = expandRanges(np.zeros(len(minX), dtype=np.int64), columnCounts * rowCounts)
+        column = firstColumn[item] + local // rowCounts[item]
+        row = firstRow[item] + local % rowCounts[item]
+        return item, column * self.rows + row
+
+    def candidatePairs(self, minX, minY, maxX, maxY):
+        """Get unique (itemIndex, segmentIndex) pairs whose envelopes share a grid cell."""
+        item, keys = self._cellPairs(minX, minY, maxX, maxY)
+        lows = np.searchsorted(self._cellKeys, keys, 'left')
+        highs = np.searchsorted(self._cellKeys, keys, 'right')
+        owner, positions = expandRanges(lows, highs - lows)
+        pairKeys = np.unique(item[owner] * max(len(self), 1) + self._cellSegments[positions])
+        return pairKeys // max(len(self), 1), pairKeys % max(len(self), 1)
+
+    def segmentCandidatePairs(self, x0, y0, x1, y1, distance):
+        """Get unique (querySegment, segmentIndex) pairs of segments that may be within distance of each other.
+
+        Query segments are split into pieces about one cell long, so the cells searched grow with the length of a
+        segment instead of the area of its envelope."""
+        querySegments, px0, py0, px1, py1 = splitSegments(x0, y0, x1, y1, max(self.cellSize, 2.0 * distance))
+        pieces, segments = self.candidatePairs(np.minimum(px0, px1) - distance, np.minimum(py0, py1) - distance,
+                                               np.maximum(px0, px1) + distance, np.maximum(py0, py1) + distance)
+        pairKeys = np.unique(querySegments[pieces] * max(len(self), 1) + segments)
+        return pairKeys // max(len(self), 1), pairKeys % max(len(self), 1)
+
+    def _pointPairsWithin(self, x, y, radius):
+        """Get (pointIndex, segmentIndex, distance) for every point and segment within radius of each other."""
+        points, segments = self.candidatePairs(x - radius, y - radius, x + radius, y + radius)
+        distances = pointSegmentDistance(x[points], y[points],
+                                         self.x0[segments], self.y0[segments],
+                                         self.x1[segments], self.y1[segments])
+        within = distances <= radius
+        return points[within], segments[within], distances[within]
+
+    def _segmentPairsNear(self, x0, y0, x1, y1, distance):
+        """Get (querySegment, segmentIndex) pairs of segments whose envelopes are within distance of each other.
+
+        Candidates from the grid are filtered with a cheap envelope test before any exact distance test."""
+        minX = np.minimum(x0, x1) - distance
+        minY = np.minimum(y0, y1) - distance
+        maxX = np.maximum(x0, x1) + distance
+        maxY = np.maximum(y0, y1) + distance
+        querySegments, segments = self.segmentCandidatePairs(x0, y0, x1, y1, distance)
+        overlaps = ((minX[querySegments] <= self.maxX[segments]) & (maxX[querySegments] >= self.minX[segments]) &
+                    (minY[querySegments] <= self.maxY[segments]) & (maxY[querySegments] >= self.minY[segments]))
+        return querySegments[overlaps], segments[overlaps]
+
+    def nearest(self, x, y, radius, chunkSize=200000):
+        """Get the nearest feature id and distance for points, -1 for both when none is within radius."""
+        nearFids, nearDists = self.nearestByGroup(x, y, radius, np.zeros(len(self), dtype=np.int64), 1, chunkSize)
+        return nearFids[0], nearDists[0]
+
+    def nearestByGroup(self, x, y, radius, segmentGroups, groupCount, chunkSize=200000):
+        """Get (groupCount, pointCount) arrays of the nearest feature id and distance among each group's segments.
+
+        segmentGroups is the group number of every indexed segment. One candidate search serves every group."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        nearFids = filled((groupCount, len(x)), -1, np.int64)
+        nearDists = filled((groupCount, len(x)), -1, np.float64)
+
+        for start in range(0, len(x), chunkSize):
+            points, segments, distances = self._pointPairsWithin(x[start:start + chunkSize],
+                                                                 y[start:start + chunkSize], radius)
+            groups = segmentGroups[segments]
+            # Closest segment first for each point and group, ties go to the lowest feature id.
+            order = np.lexsort((self.featureIds[segments], distances, groups, points))
+            points = points[order]
+            groups = groups[order]
+            first = np.ones(len(points), dtype=bool)
+            first[1:] = (points[1:] != points[:-1]) | (groups[1:] != groups[:-1])
+            nearFids[groups[first], start + points[first]] = self.featureIds[segments[order][first]]
+            nearDists[groups[first], start + points[first]] = distances[order][first]
+
+        return nearFids, nearDists
+
+    def nearestK(self, x, y, radius, count, chunkSize=200000):
+        """Get (pointCount, count) arrays of the nearest distinct feature ids and distances within radius.
+
+        Candidates are ordered closest first with ties going to the lowest feature id, unused slots are -1."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        nearFids = filled((len(x), count), -1, np.int64)
+        nearDists = filled((len(x), count), -1, np.float64)
+
+        for start in range(0, len(x), chunkSize):
+            points, segments, distances = self._pointPairsWithin(x[start:start + chunkSize],
+                                                                 y[start:start + chunkSize], radius)
+            fids = self.featureIds[segments]
+            # Closest segment of each feature for each point
+            order = np.lexsort((distances, fids, points))
+            points = points[order]
+            fids = fids[order]
+            distances = distances[order]
+            first = np.ones(len(points), dtype=bool)
+            first[1:] = (points[1:] != points[:-1]) | (fids[1:] != fids[:-1])
+            points = points[first]
+            fids = fids[first]
+            distances = distances[first]
+            # Rank the features of each point
+            order = np.lexsort((fids, distances, points))
+            points = points[order]
+            newPoint = np.ones(len(points), dtype=bool)
+            newPoint[1:] = points[1:] != points[:-1]
+            positions = np.arange(len(points))
+            rank = positions - np.maximum.accumulate(np.where(newPoint, positions, 0))
+            kept = rank < count
+            nearFids[start + points[kept], rank[kept]] = fids[order][kept]
+            nearDists[start + points[kept], rank[kept]] = distances[order][kept]
+
+        return nearFids, nearDists
+
+    def pairsWithin(self, lines, distance, chunkSize=200000):
+        """Get (featureIndex, segmentIndex) pairs of features in lines and indexed segments within distance."""
+        featureIndex, x0, y0, x1, y1 = lines.segments()
+        features = []
+        segmentIndexes = []
+        for start in range(0, len(featureIndex), chunkSize):
+            end = start + chunkSize
+            querySegments, segments = self._segmentPairsNear(x0[start:end], y0[start:end], x1[start:end],
+                                                             y1[start:end], distance)
+            querySegments = querySegments + start
+            distances = segmentSegmentDistance(x0[querySegments], y0[querySegments],
+                                               x1[querySegments], y1[querySegments],
+                                               self.x0[segments], self.y0[segments],
+                                               self.x1[segments], self.y1[segments])
+            features.append(featureIndex[querySegments[distances <= distance]])
+            segmentIndexes.append(segments[distances <= distance])
+
+        if len(features) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(features), np.concatenate(segmentIndexes)
+
+    def linesWithin(self, lines, distance, chunkSize=200000):
+        """Get a mask of the features in lines that are within distance of any indexed segment."""
+        within = np.zeros(len(lines), dtype=bool)
+        within[self.pairsWithin(lines, distance, chunkSize)[0]] = True
+        return within
+
+    def coveredMeasures(self, lines, distance, chunkSize=200000):
+        """Get (featureIndex, featureId, start, end) for the measure ranges of lines within distance of indexed segments.
+
+        featureIndex is the index in lines, featureId is the id of the indexed feature. Measures are lengths along
+        the line, ranges from different segments of the same features can overlap."""
+        segmentFeature, x0, y0, x1, y1 = lines.segments()
+        measure, length = lines.segmentMeasures()[1:]
+        results = []
+        for start in range(0, len(segmentFeature), chunkSize):
+            end = start + chunkSize
+            querySegments, segments = self._segmentPairsNear(x0[start:end], y0[start:end], x1[start:end],
+                                                             y1[start:end], distance)
+            querySegments = querySegments + start
+            rangeStart, rangeEnd = segmentCapsuleRange(x0[querySegments], y0[querySegments],
+                                                       x1[querySegments], y1[querySegments],
+                                                       self.x0[segments], self.y0[segments],
+                                                       self.x1[segments], self.y1[segments],
+                                                       distance)
+            found = rangeEnd > rangeStart
+            querySegments = querySegments[found]
+            results.append((segmentFeature[querySegments],
+                            self.featureIds[segments[found]],
+                            measure[querySegments] + rangeStart[found] * length[querySegments],
+                            measure[querySegments] + rangeEnd[found] * length[querySegments]))
+
+        if len(results) == 0:
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                    np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64))
+        return tuple(np.concatenate(c) for c in zip(*results))
+
+
+def iterLinesNear(features, index, distance, chunkSize=10000):
+    """Filter a stream of (id, parts) line features to the ones within distance of an indexed segment."""
+    chunk = []
+    for feature in features:
+        chunk.append(feature)
+        if len(chunk) >= chunkSize:
+            for i in np.flatnonzero(index.linesWithin(LineArrays.fromParts(chunk), distance)):
+                yield chunk[i]
+            chunk = []
+
+    if chunk:
+        for i in np.flatnonzero(index.linesWithin(LineArrays.fromParts(chunk), distance)):
+            yield chunk[i]
@@ -0,0 +1,163 @@
+"""Run the road coverage pipeline on vertex arrays. Does not require arcpy."""
+import numpy as np
+from coverage import candidateCoverageArrays, coverageArrays, mergedRangeLengths
+from functools import partial
+from linearrays import LineArrays, isIn
+from math import ceil, sqrt
+from multiprocessing import Pool, cpu_count
+from nearest import SegmentIndex
+from streaming import iterChunks, pipelined
+
+
+def roadCoverageArrays(roads, bikeLanes, distFromBikeLanes, sampleCount=3, exact=False, nearestCount=1):
+    """Get the coverage array for roads and bike lanes stored as LineArrays.
+
+    When exact is True Precent is the exact fraction of each road within distFromBikeLanes of each lane.
+    When nearestCount is more than 1 coverage is accumulated for that many of the closest lanes of each point."""
+    return indexedRoadCoverageArrays(roads, SegmentIndex(bikeLanes, minCellSize=distFromBikeLanes), distFromBikeLanes,
+                                     sampleCount, exact, nearestCount)
+
+
+def indexedRoadCoverageArrays(roads, laneIndex, distFromBikeLanes, sampleCount=3, exact=False, nearestCount=1):
+    """Same as roadCoverageArrays with a SegmentIndex of the bike lanes that can be shared between calls."""
+    points = roads.samplePoints(sampleCount)
+    if nearestCount > 1:
+        nearFids, nearDists = laneIndex.nearestK(points['x'], points['y'], distFromBikeLanes, nearestCount)
+        coverage = candidateCoverageArrays(points['LineId'], points['LinePos'], nearFids, nearDists, sampleCount)
+    else:
+        nearFids, nearDists = laneIndex.nearest(points['x'], points['y'], distFromBikeLanes)
+        coverage = coverageArrays(points['LineId'], points['LinePos'], nearFids, nearDists, sampleCount)
+    if exact:
+        coverage = exactCoverage(coverage, roads, laneIndex, distFromBikeLanes)
+    return coverage
+
+
+def _chunkCoverage(laneIndex, distFromBikeLanes, sampleCount, exact, nearestCount, roads):
+    """Select the roads of one chunk that are near a bike lane and get their coverage."""
+    nearRoads = roads.take(np.flatnonzero(laneIndex.linesWithin(roads, distFromBikeLanes)))
+    return indexedRoadCoverageArrays(nearRoads, laneIndex, distFromBikeLanes, sampleCount, exact, nearestCount)
+
+
+def pipelinedRoadCoverageArrays(roadFeatures, bikeLanes, distFromBikeLanes, sampleCount=3, exact=False,
+                                nearestCount=1, chunkSize=20000, workers=2, maxPending=8):
+    """Generate coverage arrays for chunks of streamed (id, parts) roads, keeping roads within distFromBikeLanes.
+
+    Reading roads, building vertex arrays and the subset, sample point, near and coverage steps run in threads
+    connected by bounded queues, so they overlap with each other and with whatever consumes the arrays.
+    Arrays are generated in the order roads are read."""
+    laneIndex = SegmentIndex(bikeLanes, minCellSize=distFromBikeLanes)
+    roadChunks = pipelined(iterChunks(roadFeatures, chunkSize), LineArrays.fromParts, 1, maxPending)
+    return pipelined(roadChunks,
+                     partial(_chunkCoverage, laneIndex, distFromBikeLanes, sampleCount, exact, nearestCount),
+                     workers,
+                     maxPending)
+
+
+def exactCoverage(coverage, roads, laneIndex, distFromBikeLanes):
+    """Replace sampled Precent values with the covered length of each road divided by its length.
+
+    Lanes that cover part of a road but were not near any sample point are added with Interx 0 and JoinDistSum 0.
+    CoverId -1 rows get the fraction of the road that no lane covers."""
+    roadIndex, laneIds, starts, ends = laneIndex.coveredMeasures(roads, distFromBikeLanes)
+    coveredRoads, coveredLanes, coveredLengths = mergedRangeLengths(roadIndex, laneIds, starts, ends)
+    unionRoads, _, unionLengths = mergedRangeLengths(roadIndex, np.zeros(len(roadIndex), dtype=np.int64),
+                                                     starts, ends)
+    segmentFeature, _, length = roads.segmentMeasures()
+    roadLengths = np.bincount(segmentFeature, weights=length, minlength=len(roads))
+    safeLengths = np.where(roadLengths > 0, roadLengths, 1.0)
+    uncovered = np.ones(len(roads))
+    uncovered[unionRoads] -= unionLengths / safeLengths[unionRoads]
+
+    idOrder = np.argsort(roads.ids, kind='mergesort')
+    coverageRoads = idOrder[np.searchsorted(roads.ids, coverage['LineId'], sorter=idOrder)]
+    # Match (road, lane) pairs through one integer key per pair.
+    keyBase = int(max(coverage['CoverId'].max() if len(coverage) else 0,
+                      coveredLanes.max() if len(coveredLanes) else 0)) + 2
+    coverageKeys = coverageRoads.astype(np.int64) * keyBase + coverage['CoverId'] + 1
+    coveredKeys = coveredRoads.astype(np.int64) * keyBase + coveredLanes + 1  # Sorted by mergedRangeLengths
+    matches = np.minimum(np.searchsorted(coveredKeys, coverageKeys), max(len(coveredKeys) - 1, 0))
+    found = (coveredKeys[matches] == coverageKeys) if len(coveredKeys) else np.zeros(len(coverage), dtype=bool)
+
+    exactRows = coverage.copy()
+    precent = np.zeros(len(exactRows))
+    precent[found] = coveredLengths[matches[found]] / safeLengths[coverageRoads[found]]
+    missing = exactRows['CoverId'] == -1
+    precent[missing] = uncovered[coverageRoads[missing]]
+    exactRows['Precent'] = np.where(roadLengths[coverageRoads] > 0, precent, coverage['Precent'])
+
+    # Every road with segments has sample rows and AllUniqueIds is the same on each of them.
+    allUniqueIds = np.zeros(len(roads), dtype=coverage.dtype['AllUniqueIds'])
+    allUniqueIds[coverageRoads] = coverage['AllUniqueIds']
+    added = ~isIn(coveredKeys, coverageKeys)
+    addedRows = np.zeros(int(added.sum()), dtype=coverage.dtype)
+    addedRows['LineId'] = roads.ids[coveredRoads[added]]
+    addedRows['CoverId'] = coveredLanes[added]
+    addedRows['Precent'] = coveredLengths[added] / safeLengths[coveredRoads[added]]
+    addedRows['AllUniqueIds'] = allUniqueIds[coveredRoads[added]]
+
+    merged = np.concatenate([exactRows, addedRows])
+    return merged[np.lexsort((merged['CoverId'], merged['LineId']))]
+
+
+def _intersects(bounds, minX, minY, maxX, maxY):
+    """Get a mask of the envelopes in bounds that intersect an envelope."""
+    boundsMinX, boundsMinY, boundsMaxX, boundsMaxY = bounds
+    return (boundsMinX <= maxX) & (boundsMaxX >= minX) & (boundsMinY <= maxY) & (boundsMaxY >= minY)
+
+
+def _tileCoverage(tileArgs):
+    """Run one tile through the pipeline in a worker process."""
+    return roadCoverageArrays(*tileArgs)
+
+
+def tiledRoadCoverageArrays(roads, bikeLanes, distFromBikeLanes, sampleCount=3, tilesPerSide=None, processes=None,
+                            exact=False, nearestCount=1):
+    """Get the same result as roadCoverageArrays by running spatial tiles of roads in a process pool."""
+    if processes is None:
+        processes = cpu_count()
+    if tilesPerSide is None:
+        tilesPerSide = int(ceil(sqrt(processes * 4)))  # A few tiles per process to balance uneven tiles
+
+    roadBounds = roads.bounds()
+    laneBounds = bikeLanes.bounds()
+    hasGeometry = ~np.isnan(roadBounds[0])
+    if not hasGeometry.any():
+        return roadCoverageArrays(roads, bikeLanes, distFromBikeLanes, sampleCount, exact, nearestCount)
+
+    # Each road is run in the one tile that holds the center of its envelope.
+    minX, minY = np.nanmin(roadBounds[0]), np.nanmin(roadBounds[1])
+    maxX, maxY = np.nanmax(roadBounds[2]), np.nanmax(roadBounds[3])
+    tileWidth = max((maxX - minX) / tilesPerSide, 1e-9)
+    tileHeight = max((maxY - minY) / tilesPerSide, 1e-9)
+    geometryRoads = np.flatnonzero(hasGeometry)
+    centerX = (roadBounds[0][geometryRoads] + roadBounds[2][geometryRoads]) / 2.0
+    centerY = (roadBounds[1][geometryRoads] + roadBounds[3][geometryRoads]) / 2.0
+    roadTiles = (np.clip(((centerX - minX) // tileWidth).astype(np.int64), 0, tilesPerSide - 1) * tilesPerSide +
+                 np.clip(((centerY - minY) // tileHeight).astype(np.int64), 0, tilesPerSide - 1))
+    order = np.argsort(roadTiles, kind='mergesort')
+    tileStarts = np.flatnonzero(np.concatenate([[True], roadTiles[order][1:] != roadTiles[order][:-1]]))
+
+    tileArgs = []
+    for tileRoads in np.split(geometryRoads[order], tileStarts[1:]):
+        # Bike lanes come from the envelope of the tile's roads so every road in a tile gets exact results.
+        # Roads are not clipped to their tile, so a long road only widens the envelope of its own tile.
+        tileLanes = np.flatnonzero(_intersects(laneBounds,
+                                               roadBounds[0][tileRoads].min() - distFromBikeLanes,
+                                               roadBounds[1][tileRoads].min() - distFromBikeLanes,
+                                               roadBounds[2][tileRoads].max() + distFromBikeLanes,
+                                               roadBounds[3][tileRoads].max() + distFromBikeLanes))
+        tileArgs.append((roads.take(np.sort(tileRoads)), bikeLanes.take(tileLanes), distFromBikeLanes, sampleCount,
+                         exact, nearestCount))
+
+    if processes > 1:
+        pool = Pool(processes)
+        try:
+            tileCoverages = pool.map(_tileCoverage, tileArgs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        tileCoverages = [_tileCoverage(args) for args in tileArgs]
+
+    merged = np.concatenate(tileCoverages)
+    return merged[np.lexsort((merged['CoverId'], merged['LineId']))]
@@ -0,0 +1,105 @@
+"""Road side preprocessing shared by every bike lane layer run against the same roads. Does not require arcpy."""
+import numpy as np
+from coverage import coverageArrays
+from linearrays import LineArrays
+from nearest import SegmentIndex
+from pipeline import exactCoverage
+
+pointNames = ['LineId', 'LinePos', 'x', 'y']
+
+
+class RoadPreprocessing(object):
+    """Sample points and a segment index for all roads, built once per road dataset version and sampleCount."""
+    memo = {}  # {key: RoadPreprocessing} for the life of the process
+
+    def __init__(self, roads, points, pointFeature, roadIndex, sampleCount):
+        """constructor."""
+        self.roads = roads
+        self.points = points
+        self.pointFeature = pointFeature  # Index in roads of each point
+        self.roadIndex = roadIndex
+        self.sampleCount = sampleCount
+
+    @staticmethod
+    def build(roads, sampleCount=3, minCellSize=1.0):
+        """Sample and index roads, minCellSize should be the distance bike lanes will be searched with."""
+        pointFeature = np.repeat(np.flatnonzero(np.diff(roads.partOffsets) > 0), sampleCount)
+        return RoadPreprocessing(roads, roads.samplePoints(sampleCount), pointFeature,
+                                 SegmentIndex(roads, minCellSize=minCellSize), sampleCount)
+
+    @staticmethod
+    def get(key, readRoads, sampleCount=3, datasetCache=None, minCellSize=1.0):
+        """Get preprocessing from this process, then datasetCache, and only build it from readRoads() when needed.
+
+        key must identify the road dataset version, sampleCount and minCellSize."""
+        if key in RoadPreprocessing.memo:
+            return RoadPreprocessing.memo[key]
+
+        cached = datasetCache.get(key) if datasetCache is not None else None
+        if cached is not None:
+            preprocessed = RoadPreprocessing.fromColumns(cached[0], cached[1], sampleCount)
+        else:
+            preprocessed = RoadPreprocessing.build(readRoads(), sampleCount, minCellSize)
+            if datasetCache is not None:
+                datasetCache.put(key, preprocessed.roads, preprocessed.columns())
+        RoadPreprocessing.memo[key] = preprocessed
+        return preprocessed
+
+    @staticmethod
+    def fromColumns(roads, columns, sampleCount):
+        """Create from roads and the columns of a DatasetCache entry."""
+        points = np.empty(len(columns['point_LineId']), dtype=[('LineId', 'i4'),
+                                                               ('LinePos', 'f8'),
+                                                               ('x', 'f8'),
+                                                               ('y', 'f8')])
+        for name in pointNames:
+            points[name] = columns['point_' + name]
+        roadIndex = SegmentIndex.fromArrays(dict((name[len('index_'):], column) for name, column in columns.items()
+                                                 if name.startswith('index_')))
+        return RoadPreprocessing(roads, points, columns['pointFeature'], roadIndex, sampleCount)
+
+    def columns(self):
+        """Get the {name: array} columns stored with the roads in a DatasetCache entry."""
+        columns = {'pointFeature': self.pointFeature}
+        for name in pointNames:
+            columns['point_' + name] = self.points[name]
+        for name, array in self.roadIndex.toArrays().items():
+            columns['index_' + name] = array
+        return columns
+
+    def coverageArrays(self, bikeLanes, distFromBikeLanes, exact=False):
+        """Get the same coverage array as roadCoverageArrays for the roads within distFromBikeLanes of bikeLanes."""
+        return self.groupCoverageArrays([bikeLanes], distFromBikeLanes, exact)[0]
+
+    def groupCoverageArrays(self, laneSets, distFromBikeLanes, exact=False):
+        """Get a coverage array for each set of bike lanes from one road selection and near search over their union.
+
+        Each array is the same as coverageArrays for that set of bike lanes on its own."""
+        lanes = LineArrays.concat(laneSets)
+        laneGroups = np.repeat(np.arange(len(laneSets)), [len(l) for l in laneSets])
+
+        # Roads within distance of each group's lanes
+        laneFeatures, roadSegments = self.roadIndex.pairsWithin(lanes, distFromBikeLanes)
+        idOrder = np.argsort(self.roads.ids, kind='mergesort')
+        pairRoads = idOrder[np.searchsorted(self.roads.ids, self.roadIndex.featureIds[roadSegments], sorter=idOrder)]
+        subsets = np.zeros((len(laneSets), len(self.roads)), dtype=bool)
+        subsets[laneGroups[laneFeatures], pairRoads] = True
+
+        anySubset = subsets.any(axis=0)
+        points = self.points[anySubset[self.pointFeature]]
+        pointFeature = self.pointFeature[anySubset[self.pointFeature]]
+        laneIndex = SegmentIndex(lanes, minCellSize=distFromBikeLanes)
+        nearFids, nearDists = laneIndex.nearestByGroup(points['x'], points['y'], distFromBikeLanes,
+                                                       laneGroups[lanes.segments()[0]], len(laneSets))
+
+        coverages = []
+        for group, groupLanes in enumerate(laneSets):
+            inGroup = subsets[group][pointFeature]
+            coverage = coverageArrays(points['LineId'][inGroup], points['LinePos'][inGroup],
+                                      nearFids[group][inGroup], nearDists[group][inGroup], self.sampleCount)
+            if exact:
+                coverage = exactCoverage(coverage, self.roads.take(np.flatnonzero(subsets[group])),
+                                         SegmentIndex(groupLanes, minCellSize=distFromBikeLanes),
+                                         distFromBikeLanes)
+            coverages.append(coverage)
+        return coverages
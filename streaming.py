@@ -0,0 +1,116 @@
+"""Overlap reading, compute and writing with worker threads and bounded queues. Does not require arcpy.
+
+Each pipelined stage reads its input in a thread, applies a function to chunks in worker threads and yields
+results in input order. Stages are chained by passing one stage's output to the next.
+"""
+import sys
+import threading
+
+try:
+    import Queue as queue  # Python 2
+except ImportError:
+    import queue
+
+_finished = object()
+
+if sys.version_info[0] < 3:
+    # The three argument raise is a syntax error in Python 3.
+    exec('def _reraise(excInfo):\n'
+         '    """Raise a sys.exc_info() tuple with the traceback of the thread it was caught in."""\n'
+         '    raise excInfo[0], excInfo[1], excInfo[2]\n')
+else:
+    def _reraise(excInfo):
+        """Raise a sys.exc_info() tuple with the traceback of the thread it was caught in."""
+        raise excInfo[1].with_traceback(excInfo[2])
+
+
+def iterChunks(items, chunkSize):
+    """Generate lists of up to chunkSize items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunkSize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _put(itemQueue, item, stopped):
+    """Put an item, giving up when the stage is stopped. Returns False when it was not put."""
+    while not stopped.is_set():
+        try:
+            itemQueue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def pipelined(chunks, function, workers=2, maxPending=8):
+    """Yield function(chunk) for every chunk in order while chunks are read and computed ahead in threads.
+
+    At most maxPending chunks are read but not yet yielded, so a slow consumer stops the reader instead of
+    filling memory. Exceptions from reading or from function are raised in the consumer."""
+    pending = queue.Queue(maxPending)  # One token per chunk read but not yet yielded
+    work = queue.Queue(maxPending)
+    results = {}
+    resultsReady = threading.Condition()
+    stopped = threading.Event()
+
+    def finish(sequence, result):
+        with resultsReady:
+            results[sequence] = result
+            resultsReady.notify()
+
+    def read():
+        sequence = 0
+        try:
+            for chunk in chunks:
+                if not _put(pending, None, stopped) or not _put(work, (sequence, chunk), stopped):
+                    return
+                sequence += 1
+        except Exception:
+            finish(sequence, (False, sys.exc_info()))
+            sequence += 1
+        finish(sequence, _finished)
+        for i in range(workers):
+            _put(work, None, stopped)
+
+    def compute():
+        while not stopped.is_set():
+            try:
+                item = work.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                return
+            sequence, chunk = item
+            try:
+                finish(sequence, (True, function(chunk)))
+            except Exception:
+                finish(sequence, (False, sys.exc_info()))
+
+    threads = [threading.Thread(target=read)] + [threading.Thread(target=compute) for i in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        # Results are buffered until every earlier chunk is done, which keeps the output order deterministic.
+        sequence = 0
+        while True:
+            with resultsReady:
+                while sequence not in results:
+                    resultsReady.wait(0.1)
+                result = results.pop(sequence)
+            if result is _finished:
+                return
+            succeeded, value = result
+            if not succeeded:
+                _reraise(value)
+            yield value
+            pending.get()
+            sequence += 1
+    finally:
+        stopped.set()
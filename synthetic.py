@@ -0,0 +1,122 @@
+"""Seeded synthetic road and bike lane networks for benchmarks. Does not require arcpy."""
+import numpy as np
+from linearrays import LineArrays
+
+bikeTypes = ['bike lane', 'shared lane', 'shared use path', 'shoulder bikeway', 'unknown', '', None]
+bikeStatuses = ['existing', 'proprosed', None]
+slCountyBikeTypes = ['2B', '2C', '3A', '3B', '', ' ', None]
+slCountyRegional = ['Y', 'y', 'N', '']
+slCountyNotes = ['', 'Striped in 2015', 'Sharrows, see the county plan for the proposed lane between the two trails']
+
+
+def _singlePartLines(ids, x, y, verticesPerLine):
+    """Create LineArrays from (lineCount, verticesPerLine) coordinate arrays."""
+    lineCount = len(ids)
+    return LineArrays(ids,
+                      np.arange(lineCount + 1),
+                      np.arange(lineCount + 1) * verticesPerLine,
+                      np.asarray(x).ravel(),
+                      np.asarray(y).ravel())
+
+
+def gridNetwork(segmentCount, seed=0, blockSize=100.0):
+    """Get roads on a square street grid with one road per block face."""
+    random = np.random.RandomState(seed)
+    nodesPerSide = int(np.ceil(np.sqrt(segmentCount / 2.0))) + 1
+    rows, columns = np.meshgrid(np.arange(nodesPerSide), np.arange(nodesPerSide - 1), indexing='ij')
+    rows = rows.ravel()
+    columns = columns.ravel()
+    # East west block faces, then north south block faces from the same index swapped
+    x0 = np.concatenate([columns, rows]) * blockSize
+    y0 = np.concatenate([rows, columns]) * blockSize
+    x1 = x0 + np.concatenate([np.ones(len(rows)), np.zeros(len(rows))]) * blockSize
+    y1 = y0 + np.concatenate([np.zeros(len(rows)), np.ones(len(rows))]) * blockSize
+    order = random.permutation(len(x0))[:segmentCount]
+    jitter = random.normal(0, 0.5, (len(order), 4))  # Digitizing noise
+    x = np.column_stack([x0[order] + jitter[:, 0], x1[order] + jitter[:, 1]])
+    y = np.column_stack([y0[order] + jitter[:, 2], y1[order] + jitter[:, 3]])
+    return _singlePartLines(np.arange(1, len(order) + 1), x, y, 2)
+
+
+def organicNetwork(segmentCount, seed=0, verticesPerLine=6, stepLength=40.0):
+    """Get curving roads from random walks with a density similar to gridNetwork."""
+    random = np.random.RandomState(seed)
+    lineCount = max(int(np.ceil(segmentCount / float(verticesPerLine - 1))), 1)
+    extent = np.sqrt(lineCount * (verticesPerLine - 1) / 2.0) * 100.0
+    heading = np.cumsum(random.normal(0, 0.3, (lineCount, verticesPerLine - 1)), axis=1)
+    heading += random.uniform(0, 2 * np.pi, (lineCount, 1))
+    step = random.uniform(0.5, 1.5, (lineCount, verticesPerLine - 1)) * stepLength
+    start = random.uniform(0, extent, (lineCount, 2))
+    x = np.column_stack([start[:, 0], start[:, 0][:, None] + np.cumsum(step * np.cos(heading), axis=1)])
+    y = np.column_stack([start[:, 1], start[:, 1][:, None] + np.cumsum(step * np.sin(heading), axis=1)])
+    return _singlePartLines(np.arange(1, lineCount + 1), x, y, verticesPerLine)
+
+
+def _offsetLines(x, y, offset):
+    """Offset (lineCount, vertexCount) coordinates to the left by offset per line."""
+    dx = np.diff(x, axis=1)
+    dy = np.diff(y, axis=1)
+    length = np.hypot(dx, dy)
+    length[length == 0] = 1.0
+    normalX = -dy / length
+    normalY = dx / length
+    # Each vertex uses the normal of the segment that starts at it, the last vertex uses the last segment.
+    normalX = np.column_stack([normalX, normalX[:, -1]])
+    normalY = np.column_stack([normalY, normalY[:, -1]])
+    return x + normalX * offset[:, None], y + normalY * offset[:, None]
+
+
+def bikeLanesForRoads(roads, seed=0, coveredFraction=0.3, maxOffset=8.0, partialProbability=0.3,
+                      parallelProbability=0.2):
+    """Get bike lanes near a random subset of single part roads and their WFRC style attributes.
+
+    Lanes are offset from their road, some only cover part of it and some roads get a lane on both sides.
+    """
+    random = np.random.RandomState(seed)
+    verticesPerLine = int(roads.vertexOffsets[1] - roads.vertexOffsets[0])
+    x = roads.x.reshape(-1, verticesPerLine)
+    y = roads.y.reshape(-1, verticesPerLine)
+
+    covered = np.flatnonzero(random.uniform(size=len(roads)) < coveredFraction)
+    parallel = covered[random.uniform(size=len(covered)) < parallelProbability]
+    roadIndexes = np.concatenate([covered, parallel])
+    offsets = random.uniform(0, maxOffset, len(roadIndexes))
+    offsets[len(covered):] *= -1  # Parallel lanes are on the other side
+    laneX, laneY = _offsetLines(x[roadIndexes], y[roadIndexes], offsets)
+
+    # Partial lanes have their first and last vertex pulled toward their neighbors.
+    partial = random.uniform(size=len(roadIndexes)) < partialProbability
+    startTrim = np.where(partial, random.uniform(0, 0.4, len(roadIndexes)), 0.0)
+    endTrim = np.where(partial, random.uniform(0, 0.4, len(roadIndexes)), 0.0)
+    laneX[:, 0] += startTrim * (laneX[:, 1] - laneX[:, 0])
+    laneY[:, 0] += startTrim * (laneY[:, 1] - laneY[:, 0])
+    laneX[:, -1] += endTrim * (laneX[:, -2] - laneX[:, -1])
+    laneY[:, -1] += endTrim * (laneY[:, -2] - laneY[:, -1])
+
+    lanes = _singlePartLines(np.arange(1, len(roadIndexes) + 1), laneX, laneY, verticesPerLine)
+    attributes = {'Type': [bikeTypes[i] for i in random.randint(0, len(bikeTypes), len(lanes))],
+                  'Stat_2015': [bikeStatuses[i] for i in random.randint(0, len(bikeStatuses), len(lanes))]}
+    return lanes, attributes
+
+
+def slCountyAttributes(laneCount, seed=0):
+    """Get Salt Lake County style attributes for laneCount bike lanes, with existing and proposed types per side."""
+    random = np.random.RandomState(seed)
+    attributes = {}
+    for field in ['BIKE_L_EXI', 'BIKE_L_PRO', 'BIKE_R_EXI', 'BIKE_R_PRO']:
+        attributes[field] = [slCountyBikeTypes[i] for i in random.randint(0, len(slCountyBikeTypes), laneCount)]
+    attributes['REGIONAL_P'] = [slCountyRegional[i] for i in random.randint(0, len(slCountyRegional), laneCount)]
+    attributes['BIKE_NOTES'] = [slCountyNotes[i] for i in random.randint(0, len(slCountyNotes), laneCount)]
+    return attributes
+
+
+def syntheticNetwork(network, segmentCount, seed=0):
+    """Get (roads, bikeLanes, bikeLaneAttributes) for a 'grid' or 'organic' network."""
+    if network == 'grid':
+        roads = gridNetwork(segmentCount, seed)
+    elif network == 'organic':
+        roads = organicNetwork(segmentCount, seed)
+    else:
+        raise ValueError('Unknown network type {}'.format(network))
+    lanes, attributes = bikeLanesForRoads(roads, seed + 1)
+    return roads, lanes, attributes
@@ -0,0 +1,126 @@
+"""Tests that the coverage engines write the same LineCoverage rows. Does not require arcpy."""
+import unittest
+import numpy as np
+from coverage import (candidateCoverageArrays, coverageArrays, iterCandidateCoverageRows, iterCoverageArrayRows,
+                      iterCoverageRows)
+from linearrays import LineArrays
+from nearest import SegmentIndex
+from pipeline import pipelinedRoadCoverageArrays, roadCoverageArrays, tiledRoadCoverageArrays
+from preprocessing import RoadPreprocessing
+from synthetic import syntheticNetwork
+
+distFromBikeLanes = 12.0
+
+
+def iterFeatures(lines):
+    """Generate (id, parts) features from LineArrays."""
+    for i, featureId in enumerate(lines.ids.tolist()):
+        parts = []
+        for part in range(lines.partOffsets[i], lines.partOffsets[i + 1]):
+            start, end = lines.vertexOffsets[part], lines.vertexOffsets[part + 1]
+            parts.append(list(zip(lines.x[start:end].tolist(), lines.y[start:end].tolist())))
+        yield featureId, parts
+
+
+class CoverageEquivalenceTests(unittest.TestCase):
+    """Each engine is compared with the one it replaced on seeded synthetic networks."""
+    networks = {}
+
+    @classmethod
+    def setUpClass(cls):
+        for network in ['grid', 'organic']:
+            roads, lanes, laneAttributes = syntheticNetwork(network, 3000, 7)
+            nearRoads = roads.take(np.flatnonzero(SegmentIndex(lanes).linesWithin(roads, distFromBikeLanes)))
+            cls.networks[network] = (roads, lanes, nearRoads)
+
+    def assertSameCoverage(self, expected, actual, tolerance=0.0):
+        self.assertEqual(expected.dtype, actual.dtype)
+        self.assertEqual(len(expected), len(actual))
+        for field in expected.dtype.names:
+            if tolerance:
+                self.assertTrue(np.allclose(expected[field], actual[field], rtol=0, atol=tolerance), field)
+            else:
+                self.assertTrue(np.array_equal(expected[field], actual[field]), field)
+
+    def nearestRows(self, network, sampleCount, count=None):
+        """Get sample points of the near roads and their nearest lane, or count nearest lanes."""
+        roads, lanes, nearRoads = self.networks[network]
+        points = nearRoads.samplePoints(sampleCount)
+        index = SegmentIndex(lanes)
+        if count is None:
+            return points, index.nearest(points['x'], points['y'], distFromBikeLanes)
+        return points, index.nearestK(points['x'], points['y'], distFromBikeLanes, count)
+
+    def test_arraysMatchStreamingRows(self):
+        for network in self.networks:
+            for sampleCount in [3, 7]:
+                points, (nearFids, nearDists) = self.nearestRows(network, sampleCount)
+                rows = sorted(zip(points['LineId'].tolist(), points['LinePos'].tolist(), nearFids.tolist(),
+                                  nearDists.tolist()))
+                streamed = [list(row) for row in iterCoverageRows(rows, sampleCount)]
+                arrays = list(iterCoverageArrayRows(coverageArrays(points['LineId'], points['LinePos'], nearFids,
+                                                                   nearDists, sampleCount)))
+                self.assertEqual(streamed, arrays)
+
+    def test_candidateArraysMatchStreamingRows(self):
+        for network in self.networks:
+            points, (nearFids, nearDists) = self.nearestRows(network, 3, count=3)
+            rows = sorted(zip(points['LineId'].tolist(), points['LinePos'].tolist(), nearFids.tolist(),
+                              nearDists.tolist()))
+            streamed = [list(row) for row in iterCandidateCoverageRows(rows, 3)]
+            arrays = list(iterCoverageArrayRows(candidateCoverageArrays(points['LineId'], points['LinePos'], nearFids,
+                                                                        nearDists, 3)))
+            self.assertEqual(streamed, arrays)
+
+    def test_oneCandidateMatchesNearest(self):
+        for network in self.networks:
+            points, (nearFids, nearDists) = self.nearestRows(network, 3)
+            kFids, kDists = self.nearestRows(network, 3, count=1)[1]
+            self.assertSameCoverage(coverageArrays(points['LineId'], points['LinePos'], nearFids, nearDists, 3),
+                                    candidateCoverageArrays(points['LineId'], points['LinePos'], kFids, kDists, 3))
+
+    def test_tiledMatchesSerial(self):
+        for network in self.networks:
+            roads, lanes, nearRoads = self.networks[network]
+            for options, tolerance in [({}, 0.0), ({'nearestCount': 2}, 0.0), ({'exact': True}, 1e-9)]:
+                self.assertSameCoverage(roadCoverageArrays(nearRoads, lanes, distFromBikeLanes, 3, **options),
+                                        tiledRoadCoverageArrays(nearRoads, lanes, distFromBikeLanes, 3, tilesPerSide=4,
+                                                                processes=1, **options),
+                                        tolerance)
+
+    def test_tiledWithLongRoadsMatchesSerial(self):
+        roads, lanes, nearRoads = self.networks['grid']
+        minX, minY, maxX, maxY = [values[~np.isnan(values)] for values in lanes.bounds()]
+        crossing = LineArrays.fromParts([(10 ** 7, [[(minX.min(), minY.min()), (maxX.max(), maxY.max())]])])
+        withLongRoad = LineArrays.concat([nearRoads, crossing])
+        self.assertSameCoverage(roadCoverageArrays(withLongRoad, lanes, distFromBikeLanes, 3),
+                                tiledRoadCoverageArrays(withLongRoad, lanes, distFromBikeLanes, 3, tilesPerSide=4,
+                                                        processes=1))
+
+    def test_sharedPreprocessingMatchesDirect(self):
+        for network in self.networks:
+            roads, lanes, nearRoads = self.networks[network]
+            preprocessed = RoadPreprocessing.build(roads, 3)
+            cached = RoadPreprocessing.fromColumns(preprocessed.roads, preprocessed.columns(), 3)
+            for exact, tolerance in [(False, 0.0), (True, 1e-9)]:
+                direct = roadCoverageArrays(nearRoads, lanes, distFromBikeLanes, 3, exact)
+                self.assertSameCoverage(direct, preprocessed.coverageArrays(lanes, distFromBikeLanes, exact), tolerance)
+                self.assertSameCoverage(direct, cached.coverageArrays(lanes, distFromBikeLanes, exact), tolerance)
+
+    def test_groupedAgenciesMatchSeparateRuns(self):
+        for network in self.networks:
+            roads, lanes, nearRoads = self.networks[network]
+            laneSets = [lanes.take(np.flatnonzero(lanes.ids % 2 == 0)), lanes.take(np.flatnonzero(lanes.ids % 2 == 1))]
+            preprocessed = RoadPreprocessing.build(roads, 3)
+            for laneSet, grouped in zip(laneSets, preprocessed.groupCoverageArrays(laneSets, distFromBikeLanes)):
+                self.assertSameCoverage(preprocessed.coverageArrays(laneSet, distFromBikeLanes), grouped)
+
+    def test_pipelinedMatchesSerial(self):
+        for network in self.networks:
+            roads, lanes, nearRoads = self.networks[network]
+            chunks = list(pipelinedRoadCoverageArrays(iterFeatures(roads), lanes, distFromBikeLanes, chunkSize=500))
+            self.assertSameCoverage(roadCoverageArrays(nearRoads, lanes, distFromBikeLanes), np.concatenate(chunks))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Tests that patching a coverage table with the manifest diff gives the same rows as a full run. Does not require arcpy."""
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from coverage import iterCoverageArrayRows
+from linearrays import LineArrays, isIn
+from manifest import RunManifest, affectedRoadIds, diffHashes, geometryHashes
+from nearest import SegmentIndex
+from operator import itemgetter
+from pipeline import roadCoverageArrays
+from synthetic import syntheticNetwork
+from translation import MapCodes, Translator, iterJoinedRows
+
+distFromBikeLanes = 12.0
+laneFields = ['Type', 'Stat_2015']
+translator = Translator([MapCodes('Type', 'BikeTypeCode', {'bike lane': '2C', 'shared lane': '3B'})])
+
+
+def moved(lines, featureIds, dx, dy):
+    """Get lines with the features in featureIds shifted by (dx, dy)."""
+    x = lines.x.copy()
+    y = lines.y.copy()
+    for i in np.flatnonzero(isIn(lines.ids, featureIds)):
+        start, end = lines.vertexOffsets[lines.partOffsets[i]], lines.vertexOffsets[lines.partOffsets[i + 1]]
+        x[start:end] += dx
+        y[start:end] += dy
+    return LineArrays(lines.ids, lines.partOffsets, lines.vertexOffsets, x, y)
+
+
+def without(lines, featureIds):
+    """Get lines without the features in featureIds."""
+    return lines.take(np.flatnonzero(~isIn(lines.ids, featureIds)))
+
+
+class Run(object):
+    """The roads, bike lanes and lane attributes of one run of an agency script."""
+
+    def __init__(self, roads, lanes, laneAttributes):
+        """constructor."""
+        self.lanes = lanes
+        self.laneAttributes = laneAttributes
+        # Agency scripts run on the roads within distance of the lanes.
+        laneIndex = SegmentIndex(lanes, minCellSize=distFromBikeLanes)
+        self.roads = roads.take(np.flatnonzero(laneIndex.linesWithin(roads, distFromBikeLanes)))
+
+    def table(self, roads=None):
+        """Get the joined coverage rows for roads, all of this run's roads by default."""
+        coverage = roadCoverageArrays(self.roads if roads is None else roads, self.lanes, distFromBikeLanes)
+        return list(iterJoinedRows(iterCoverageArrayRows(coverage), self.laneAttributes, laneFields, translator))
+
+    def hashes(self):
+        """Get the (roadHashes, laneHashes) a manifest stores for this run."""
+        return geometryHashes(self.roads), geometryHashes(self.lanes, self.laneAttributes)
+
+
+def patchedTable(previous, previousTable, current):
+    """Patch the rows of the previous run like updateRoadCoverageTable, get the rows and affected road ids."""
+    oldRoadHashes, oldLaneHashes = previous.hashes()
+    roadHashes, laneHashes = current.hashes()
+    affected = affectedRoadIds(current.roads,
+                               current.lanes,
+                               diffHashes(oldRoadHashes, roadHashes),
+                               diffHashes(oldLaneHashes, laneHashes),
+                               [row[:2] for row in previousTable],
+                               distFromBikeLanes)
+    kept = [row for row in previousTable if row[0] not in affected]
+    patch = current.table(current.roads.take(np.flatnonzero(isIn(current.roads.ids, list(affected)))))
+    return sorted(kept + patch, key=itemgetter(0, 1)), affected
+
+
+class PatchEquivalenceTests(unittest.TestCase):
+    """Each kind of edit is patched into the table of the run before it and compared with a full run."""
+
+    def setUp(self):
+        self.roads, self.lanes, attributes = syntheticNetwork('grid', 3000, 7)
+        self.laneAttributes = dict(zip(self.lanes.ids.tolist(), zip(*[attributes[f] for f in laneFields])))
+        self.editedIds = self.lanes.ids[::25].tolist()
+        self.previous = Run(self.roads, self.lanes, self.laneAttributes)
+
+    def assertPatchMatchesFullRun(self, previous, current):
+        patched, affected = patchedTable(previous, previous.table(), current)
+        self.assertEqual(current.table(), patched)
+        self.assertLess(len(affected), len(current.roads) // 2)
+
+    def test_lanesAdded(self):
+        previous = Run(self.roads, without(self.lanes, self.editedIds), self.laneAttributes)
+        self.assertPatchMatchesFullRun(previous, self.previous)
+
+    def test_lanesMoved(self):
+        self.assertPatchMatchesFullRun(self.previous, Run(self.roads, moved(self.lanes, self.editedIds, 50.0, 20.0),
+                                                          self.laneAttributes))
+
+    def test_lanesRemoved(self):
+        self.assertPatchMatchesFullRun(self.previous, Run(self.roads, without(self.lanes, self.editedIds),
+                                                          self.laneAttributes))
+
+    def test_laneAttributesEdited(self):
+        edited = dict(self.laneAttributes)
+        for laneId in self.editedIds:
+            edited[laneId] = ('shared lane' if edited[laneId][0] == 'bike lane' else 'bike lane', 'existing')
+        current = Run(self.roads, self.lanes, edited)
+        self.assertNotEqual(self.previous.table(), current.table())
+        self.assertPatchMatchesFullRun(self.previous, current)
+
+    def test_roadsEdited(self):
+        roadIds = self.previous.roads.ids[::40].tolist()
+        roads = moved(self.roads, roadIds[::2], 3.0, -2.0)
+        roads = without(roads, roadIds[1::2])
+        self.assertPatchMatchesFullRun(self.previous, Run(roads, self.lanes, self.laneAttributes))
+
+
+class ManifestTests(unittest.TestCase):
+    """Manifests are read back with the settings and integer feature ids they were saved with."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_saveAndLoad(self):
+        manifestPath = os.path.join(self.directory, 'manifests', 'lanes.json')
+        RunManifest({1: 'a'}, {2: 'b'}, 'table', 12.0, 3, ['LineId', 'Type']).save(manifestPath)
+        manifest = RunManifest.load(manifestPath)
+        self.assertEqual(({1: 'a'}, {2: 'b'}, 'table'),
+                         (manifest.roadHashes, manifest.laneHashes, manifest.coverageTablePath))
+        self.assertTrue(manifest.matchesSettings(12.0, 3, ['LineId', 'Type']))
+        self.assertFalse(manifest.matchesSettings(12.0, 3, ['LineId']))
+        self.assertIsNone(RunManifest.load(os.path.join(self.directory, 'missing.json')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Tests for the grid segment index. Does not require arcpy."""
+import unittest
+import numpy as np
+from linearrays import LineArrays
+from nearest import SegmentIndex, segmentSegmentDistance
+from synthetic import syntheticNetwork
+
+
+def longLines(lanes, count, length, seed=0):
+    """Get count straight lines of length in random directions starting inside the extent of lanes."""
+    minX, minY, maxX, maxY = [values[~np.isnan(values)] for values in lanes.bounds()]
+    random = np.random.RandomState(seed)
+    features = []
+    for i in range(count):
+        x = random.uniform(minX.min(), maxX.max())
+        y = random.uniform(minY.min(), maxY.max())
+        angle = random.uniform(0, 2 * np.pi)
+        features.append((i, [[(x, y), (x + length * np.cos(angle), y + length * np.sin(angle))]]))
+    return LineArrays.fromParts(features)
+
+
+def densified(lines, spacing):
+    """Get lines with vertices added so no segment is longer than spacing."""
+    features = []
+    for i, featureId in enumerate(lines.ids.tolist()):
+        parts = []
+        for part in range(lines.partOffsets[i], lines.partOffsets[i + 1]):
+            start, end = lines.vertexOffsets[part], lines.vertexOffsets[part + 1]
+            points = [(lines.x[start], lines.y[start])]
+            for v in range(start, end - 1):
+                length = np.hypot(lines.x[v + 1] - lines.x[v], lines.y[v + 1] - lines.y[v])
+                count = max(int(np.ceil(length / spacing)), 1)
+                for t in np.arange(1, count + 1) / float(count):
+                    points.append((lines.x[v] + t * (lines.x[v + 1] - lines.x[v]),
+                                   lines.y[v] + t * (lines.y[v + 1] - lines.y[v])))
+            parts.append(points)
+        features.append((featureId, parts))
+    return LineArrays.fromParts(features)
+
+
+def bruteForcePairs(lines, index, distance):
+    """Get the sorted (featureIndex, segmentIndex) pairs within distance by testing every pair."""
+    featureIndex, x0, y0, x1, y1 = lines.segments()
+    query, segment = np.meshgrid(np.arange(len(x0)), np.arange(len(index)), indexing='ij')
+    query = query.ravel()
+    segment = segment.ravel()
+    within = segmentSegmentDistance(x0[query], y0[query], x1[query], y1[query],
+                                    index.x0[segment], index.y0[segment],
+                                    index.x1[segment], index.y1[segment]) <= distance
+    return sorted(zip(featureIndex[query[within]].tolist(), segment[within].tolist()))
+
+
+class LongSegmentTests(unittest.TestCase):
+    """Long segments are searched in the cells along them instead of every cell of their envelope."""
+
+    def setUp(self):
+        self.lanes = syntheticNetwork('grid', 2000, 1)[1]
+        self.index = SegmentIndex(self.lanes, cellSize=35.0)
+        self.lines = longLines(self.lanes, 20, 10000.0)
+
+    def test_pairsWithinMatchesBruteForce(self):
+        features, segments = self.index.pairsWithin(self.lines, 12.0)
+        self.assertEqual(sorted(zip(features.tolist(), segments.tolist())),
+                         bruteForcePairs(self.lines, self.index, 12.0))
+
+    def test_queryCellsGrowWithLength(self):
+        cellCounts = []
+        cellPairs = self.index._cellPairs
+
+        def countingCellPairs(*envelopes):
+            pairs = cellPairs(*envelopes)
+            cellCounts.append(len(pairs[0]))
+            return pairs
+        self.index._cellPairs = countingCellPairs
+        self.index.pairsWithin(self.lines, 12.0)
+        # Every cell of a 10 km diagonal envelope would be about 80000 cells per line
+        self.assertLess(sum(cellCounts), len(self.lines) * 4 * 10000.0 / self.index.cellSize)
+
+    def test_indexCellsGrowWithLength(self):
+        index = SegmentIndex(self.lines, cellSize=35.0)
+        self.assertLess(len(index._cellKeys), len(self.lines) * 4 * 10000.0 / index.cellSize)
+        features, segments = self.index.pairsWithin(self.lines, 12.0)
+        reversedFeatures, reversedSegments = index.pairsWithin(self.lanes, 12.0)
+        self.assertEqual(set(features.tolist()), set(index.featureIds[reversedSegments].tolist()))
+
+
+
+class DenseVertexTests(unittest.TestCase):
+    """Cells are at least the query radius when lanes have many short segments."""
+
+    def setUp(self):
+        roads, lanes = syntheticNetwork('grid', 300, 2)[:2]
+        self.lanes = densified(lanes, 0.5)
+        self.points = roads.samplePoints(3)
+
+    def test_cellSizeIsAtLeastRadius(self):
+        self.assertLess(SegmentIndex(self.lanes).cellSize, 12.0)
+        self.assertEqual(SegmentIndex(self.lanes, minCellSize=12.0).cellSize, 12.0)
+
+    def test_radiusCellsMatchMedianCells(self):
+        medianIndex = SegmentIndex(self.lanes)
+        radiusIndex = SegmentIndex(self.lanes, minCellSize=12.0)
+        expected = medianIndex.nearest(self.points['x'], self.points['y'], 12.0)
+        actual = radiusIndex.nearest(self.points['x'], self.points['y'], 12.0)
+        self.assertTrue(np.array_equal(expected[0], actual[0]))
+        self.assertTrue(np.array_equal(expected[1], actual[1]))
+        # A 24 unit query envelope touches at most 3 by 3 cells of 12
+        items, keys = radiusIndex._cellPairs(self.points['x'] - 12.0, self.points['y'] - 12.0,
+                                             self.points['x'] + 12.0, self.points['y'] + 12.0)
+        self.assertLessEqual(len(keys), 9 * len(self.points))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""Tests for the threaded pipeline stages. Does not require arcpy."""
+import sys
+import traceback
+import unittest
+from streaming import iterChunks, pipelined
+
+
+def failOnSeven(chunk):
+    """Sum a chunk, failing on the chunk holding 7."""
+    if 7 in chunk:
+        raise ValueError('Chunk {} failed'.format(chunk))
+    return sum(chunk)
+
+
+def failingReader():
+    """Generate a few items and then fail."""
+    for i in range(5):
+        yield i
+    raise IOError('Reader failed')
+
+
+class PipelinedTests(unittest.TestCase):
+    """Results come back in input order and failures are raised in the consumer."""
+
+    def test_resultsInOrder(self):
+        self.assertEqual([sum(c) for c in iterChunks(range(100), 3)],
+                         list(pipelined(iterChunks(range(100), 3), sum, workers=4, maxPending=2)))
+
+    def test_workerTracebackIsKept(self):
+        try:
+            list(pipelined(iterChunks(range(20), 2), failOnSeven))
+        except ValueError:
+            functionNames = [frame[2] for frame in traceback.extract_tb(sys.exc_info()[2])]
+        self.assertIn('failOnSeven', functionNames)
+
+    def test_readerFailure(self):
+        results = []
+        with self.assertRaises(IOError):
+            for result in pipelined(iterChunks(failingReader(), 2), sum):
+                results.append(result)
+        self.assertEqual([1, 5], results)
+
+
+if __name__ == '__main__':
+    unittest.main()
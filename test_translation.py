@@ -0,0 +1,114 @@
+"""Tests that the agency translators give the same fields as the cursor loops they replaced. Does not require arcpy."""
+import unittest
+from agencyrules import (slCountyBikeLaneFields, slCountyTranslationFields, slCountyTranslator, wfrcBikeLaneFields,
+                         wfrcTranslator)
+from synthetic import slCountyAttributes, syntheticNetwork
+from translation import iterJoinedRows, joinedFields
+
+slCountyOutputFields = [f[0] for f in slCountyTranslationFields]
+
+
+def isEmpty(fieldValue):
+    """Return true for None or empty whitespace strings"""
+    return fieldValue is None or str(fieldValue).strip() == ''
+
+
+def slCountyLoop(row):
+    """The UpdateCursor loop of saltlakecounty.translateBikeFieldsToDomain for one {field: value} row.
+
+    The loop raised TypeError for None in the fields it joins or slices, here None is an empty string there."""
+    row = dict(row)
+    if not isEmpty(row['BIKE_L_PRO']) or not isEmpty(row['BIKE_R_PRO']):
+        row['BIKE_L'] = row['BIKE_L_PRO']
+        row['BIKE_R'] = row['BIKE_R_PRO']
+        row['RD_BIKE_NOTES'] = '|'.join([row[f] or '' for f in ['BIKE_L_PRO', 'BIKE_R_PRO', 'REGIONAL_P',
+                                                                 'BIKE_NOTES']])[:50]
+        row['BIKE_STATUS'] = 'P'
+        if (row['REGIONAL_P'] or '').upper() == 'Y':
+            row['BIKE_STATUS'] = None
+
+    for side in ['L', 'R']:
+        if not isEmpty(row['BIKE_{}_EXI'.format(side)]):
+            row['BIKE_{}'.format(side)] = row['BIKE_{}_EXI'.format(side)]
+            row['BIKE_STATUS'] = 'E'
+            if isEmpty(row['RD_BIKE_NOTES']):
+                row['RD_BIKE_NOTES'] = row['BIKE_NOTES'][:50] if row['BIKE_NOTES'] is not None else None
+    return row
+
+
+def wfrcLoop(row, typeCodes, statusCodes):
+    """The UpdateCursor loop of wfrc.translateBikeFieldsToDomain for one {field: value} row."""
+    row = dict(row)
+    if row['Type'] is not None and row['Type'].lower().strip() in typeCodes:
+        row['BikeTypeCode'] = typeCodes[row['Type'].lower().strip()]
+    if row['Stat_2015'] is not None and row['Stat_2015'].lower().strip() in statusCodes:
+        row['Stat_2015'] = statusCodes[row['Stat_2015'].lower().strip()]
+    return row
+
+
+class TranslatorTests(unittest.TestCase):
+    """Joined rows are compared with the loops applied to the same bike lane attributes."""
+
+    def joinedRows(self, laneRows, laneFields, translator):
+        """Get {field: value} dicts of the joined fields for one coverage row per bike lane."""
+        fields = joinedFields(laneFields, translator)
+        coverageRows = [[lineId, laneId] for lineId, laneId in enumerate(sorted(laneRows))]
+        return [dict(zip(fields, row[2:]))
+                for row in iterJoinedRows(coverageRows, laneRows, laneFields, translator, batchSize=7)]
+
+    def loopRows(self, laneRows, laneFields, outputFields, loop):
+        """Get the rows of the loop on a table with laneFields joined and empty outputFields added."""
+        rows = []
+        for laneId in sorted(laneRows):
+            row = dict((f, None) for f in outputFields)
+            row.update(zip(laneFields, laneRows[laneId]))
+            rows.append(loop(row))
+        return rows
+
+    def test_slCountyMatchesLoop(self):
+        attributes = slCountyAttributes(2000, 5)
+        laneRows = dict(enumerate(zip(*[attributes[f] for f in slCountyBikeLaneFields])))
+        self.assertEqual(self.loopRows(laneRows, slCountyBikeLaneFields, slCountyOutputFields, slCountyLoop),
+                         self.joinedRows(laneRows, slCountyBikeLaneFields, slCountyTranslator()))
+
+    def test_slCountySides(self):
+        longNotes = 'n' * 60
+        cases = [
+            # BIKE_L_EXI, BIKE_L_PRO, BIKE_R_EXI, BIKE_R_PRO, REGIONAL_P, BIKE_NOTES
+            (None, None, '2C', None, '', longNotes),
+            ('2B', None, ' ', '3A', 'N', longNotes),
+            (None, '3B', None, '', 'y', 'regional'),
+            ('', ' ', None, None, None, None),
+            ('2C', None, '3B', None, 'Y', None),
+            (None, None, None, '2B', None, None)]
+        laneRows = dict(enumerate(cases))
+        joined = self.joinedRows(laneRows, slCountyBikeLaneFields, slCountyTranslator())
+        self.assertEqual(self.loopRows(laneRows, slCountyBikeLaneFields, slCountyOutputFields, slCountyLoop), joined)
+        self.assertEqual([(r['BIKE_L'], r['BIKE_R'], r['BIKE_STATUS']) for r in joined],
+                         [(None, '2C', 'E'), ('2B', '3A', 'E'), ('3B', '', None), (None, None, None),
+                          ('2C', '3B', 'E'), (None, '2B', 'P')])
+        self.assertEqual([longNotes[:50], ('|3A|N|' + longNotes)[:50]], [r['RD_BIKE_NOTES'] for r in joined[:2]])
+
+    def test_wfrcMatchesLoop(self):
+        lanes, attributes = syntheticNetwork('grid', 3000, 5)[1:]
+        types = attributes['Type'] + ['Category 1 ', 'bike boulevard', ' UNKNOWN', '']
+        statuses = attributes['Stat_2015'] + ['Existing', 'planned', None, ' proprosed ']
+        laneRows = dict(enumerate(zip(types, statuses)))
+        translator = wfrcTranslator()
+        codes = [rule.codes for rule in translator.rules]
+        self.assertEqual(self.loopRows(laneRows, wfrcBikeLaneFields, ['BikeTypeCode'],
+                                       lambda row: wfrcLoop(row, codes[0], codes[1])),
+                         self.joinedRows(laneRows, wfrcBikeLaneFields, translator))
+
+    def test_rowsWithoutBikeLane(self):
+        rows = list(iterJoinedRows([[1, -1], [2, 99]], {}, slCountyBikeLaneFields, slCountyTranslator()))
+        self.assertEqual([[1, -1] + [None] * 10, [2, 99] + [None] * 10], rows)
+
+    def test_outputFieldOrder(self):
+        self.assertEqual(slCountyBikeLaneFields + ['BIKE_R', 'BIKE_L', 'RD_BIKE_NOTES', 'BIKE_STATUS'],
+                         joinedFields(slCountyBikeLaneFields, slCountyTranslator()))
+        self.assertEqual(['Type', 'Stat_2015', 'BikeTypeCode'], joinedFields(wfrcBikeLaneFields, wfrcTranslator()))
+
+
+if __name__ == '__main__':
+    unittest.main()
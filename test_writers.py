@@ -0,0 +1,100 @@
+"""Tests that coverage table sinks write every row and leave nothing behind when writing fails. Does not require arcpy."""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from writers import BufferedWriter, ParquetSink, coverageFields, sinkForPath
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+schema = coverageFields + [('BikeTypeCode', 'TEXT', 5)]
+rows = [[i, i % 7 - 1, i * 0.5, 0.25, i % 3, i % 2, None if i % 4 else 'B{}'.format(i)] for i in range(23)]
+
+
+class SinkTests(unittest.TestCase):
+    """Rows are written in batches smaller than the table."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def writeTable(self, path, tableRows, batchSize=5):
+        """Write rows through a BufferedWriter and get the result."""
+        with BufferedWriter(sinkForPath(path, 'LineCoverage'), schema, batchSize) as writer:
+            writer.writeRows(tableRows)
+        return writer.sink.result()
+
+    def writeFailingTable(self, path):
+        """Write some batches and raise before the writer is closed."""
+        with self.assertRaises(RuntimeError):
+            with BufferedWriter(sinkForPath(path, 'LineCoverage'), schema, 5) as writer:
+                writer.writeRows(rows)
+                raise RuntimeError('Failed after {} rows'.format(writer.rowCount))
+
+    def readSqlite(self, path, sql):
+        """Get every row of a query."""
+        connection = sqlite3.connect(path)
+        try:
+            return [list(row) for row in connection.execute(sql)]
+        finally:
+            connection.close()
+
+    def test_sqliteRoundTrip(self):
+        for extension in ['.sqlite', '.gpkg']:
+            path = self.writeTable(os.path.join(self.directory, 'coverage' + extension), rows)
+            fields = ', '.join('"{}"'.format(f[0]) for f in schema)
+            self.assertEqual(rows, self.readSqlite(path, 'SELECT {} FROM LineCoverage ORDER BY fid'.format(fields)))
+
+    def test_geoPackageMetadata(self):
+        path = self.writeTable(os.path.join(self.directory, 'coverage.gpkg'), rows)
+        self.assertEqual([[1196444487]], self.readSqlite(path, 'PRAGMA application_id'))
+        self.assertEqual([[-1], [0], [4326]],
+                         self.readSqlite(path, 'SELECT srs_id FROM gpkg_spatial_ref_sys ORDER BY srs_id'))
+        self.assertEqual([['LineCoverage', 'attributes']],
+                         self.readSqlite(path, 'SELECT table_name, data_type FROM gpkg_contents'))
+        # A second table in the same GeoPackage keeps the first one registered.
+        with BufferedWriter(sinkForPath(path, 'Other'), schema) as writer:
+            writer.writeRows(rows[:3])
+        self.assertEqual([['LineCoverage'], ['Other']],
+                         self.readSqlite(path, 'SELECT table_name FROM gpkg_contents ORDER BY table_name'))
+
+    def test_sqliteAbortOnException(self):
+        for extension in ['.sqlite', '.gpkg']:
+            path = os.path.join(self.directory, 'failed' + extension)
+            self.writeFailingTable(path)
+            tables = self.readSqlite(path, "SELECT name FROM sqlite_master WHERE type = 'table'")
+            self.assertNotIn(['LineCoverage'], tables)
+            if extension == '.gpkg':
+                self.assertEqual([], self.readSqlite(path, 'SELECT table_name FROM gpkg_contents'))
+
+    def test_emptyTable(self):
+        path = self.writeTable(os.path.join(self.directory, 'empty.sqlite'), [])
+        self.assertEqual([[0]], self.readSqlite(path, 'SELECT count(*) FROM LineCoverage'))
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquetRoundTrip(self):
+        path = self.writeTable(os.path.join(self.directory, 'coverage.parquet'), rows)
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual([f[0] for f in schema], table.schema.names)
+        self.assertEqual(rows, [list(row) for row in zip(*[table.column(f[0]).to_pylist() for f in schema])])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquetAbortOnException(self):
+        path = os.path.join(self.directory, 'failed.parquet')
+        self.writeFailingTable(path)
+        self.assertFalse(os.path.exists(path))
+
+    def test_unknownExtension(self):
+        with self.assertRaises(ValueError):
+            sinkForPath(os.path.join(self.directory, 'coverage.csv'), 'LineCoverage')
+        self.assertIsInstance(sinkForPath('coverage.parquet', 'LineCoverage'), ParquetSink)
+
+
+if __name__ == '__main__':
+    unittest.main()
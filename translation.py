@@ -0,0 +1,237 @@
+"""Declarative, vectorized translation of bike lane attributes to road fields. Does not require arcpy.
+
+Rules are applied in order to whole columns. Conditions are evaluated against the columns as they are
+after the previous rules, the same as an if statement in a cursor loop.
+"""
+import numpy as np
+
+
+def _isNone(column):
+    """Get a mask of the None values in a column."""
+    return np.equal(column, None)
+
+
+def _text(column):
+    """Get a unicode array of a column with None as an empty string."""
+    return np.where(_isNone(column), u'', column).astype('U')
+
+
+class Field(object):
+    """Value of a field, optionally truncated to length."""
+
+    def __init__(self, name, length=None):
+        """constructor."""
+        self.name = name
+        self.length = length
+        self.fields = [name]
+
+    def values(self, columns):
+        """Get the value column."""
+        column = columns[self.name]
+        if self.length is None:
+            return column
+        truncated = _text(column).astype('U{}'.format(self.length)).astype(object)
+        return np.where(_isNone(column), None, truncated)
+
+
+class Constant(object):
+    """The same value for every row."""
+
+    def __init__(self, value):
+        """constructor."""
+        self.value = value
+        self.fields = []
+
+    def values(self, columns):
+        """Get the value column."""
+        column = np.empty(len(next(iter(columns.values()))), dtype=object)
+        column[:] = self.value
+        return column
+
+
+class Concat(object):
+    """Join the text of fields with a separator, None is treated as an empty string."""
+
+    def __init__(self, names, separator, length=None):
+        """constructor."""
+        self.fields = list(names)
+        self.separator = separator
+        self.length = length
+
+    def values(self, columns):
+        """Get the value column."""
+        joined = _text(columns[self.fields[0]])
+        for name in self.fields[1:]:
+            joined = np.char.add(np.char.add(joined, self.separator), _text(columns[name]))
+        if self.length is not None:
+            joined = joined.astype('U{}'.format(self.length))
+        return joined.astype(object)
+
+
+class NotEmpty(object):
+    """True where a field is not None or whitespace."""
+
+    def __init__(self, name):
+        """constructor."""
+        self.name = name
+        self.fields = [name]
+
+    def mask(self, columns):
+        """Get the condition for every row."""
+        column = columns[self.name]
+        return ~_isNone(column) & (np.char.strip(_text(column)) != u'')
+
+
+class IsEmpty(NotEmpty):
+    """True where a field is None or whitespace."""
+
+    def mask(self, columns):
+        """Get the condition for every row."""
+        return ~NotEmpty.mask(self, columns)
+
+
+class Equals(object):
+    """True where a field equals a value, ignoring case."""
+
+    def __init__(self, name, value):
+        """constructor."""
+        self.name = name
+        self.value = value.upper()
+        self.fields = [name]
+
+    def mask(self, columns):
+        """Get the condition for every row."""
+        column = columns[self.name]
+        return ~_isNone(column) & (np.char.upper(_text(column)) == self.value)
+
+
+class AnyOf(object):
+    """True where any condition is true."""
+
+    def __init__(self, *conditions):
+        """constructor."""
+        self.conditions = conditions
+        self.fields = [f for c in conditions for f in c.fields]
+
+    def mask(self, columns):
+        """Get the condition for every row."""
+        return np.logical_or.reduce([c.mask(columns) for c in self.conditions])
+
+
+class AllOf(AnyOf):
+    """True where every condition is true."""
+
+    def mask(self, columns):
+        """Get the condition for every row."""
+        return np.logical_and.reduce([c.mask(columns) for c in self.conditions])
+
+
+class Assign(object):
+    """Set target to a value where a condition is true, or everywhere without a condition."""
+
+    def __init__(self, target, value, when=None):
+        """constructor."""
+        self.target = target
+        self.value = value
+        self.when = when
+        self.fields = [target] + value.fields + (when.fields if when is not None else [])
+
+    def apply(self, columns):
+        """Update the target column in place."""
+        values = self.value.values(columns)
+        if self.when is None:
+            columns[self.target] = values
+        else:
+            columns[self.target] = np.where(self.when.mask(columns), values, columns[self.target])
+
+
+class MapCodes(object):
+    """Set target to codes[source.lower().strip()] where source is not None and the value has a code."""
+
+    def __init__(self, source, target, codes):
+        """constructor."""
+        self.source = source
+        self.target = target
+        self.codes = codes
+        self.fields = [source, target]
+
+    def apply(self, columns):
+        """Update the target column in place."""
+        column = columns[self.source]
+        # Look up each distinct value once
+        distinct, inverse = np.unique(np.char.strip(np.char.lower(_text(column))), return_inverse=True)
+        hasCode = np.array([v in self.codes for v in distinct.tolist()], dtype=bool)
+        codes = np.array([self.codes.get(v) for v in distinct.tolist()], dtype=object)
+        found = hasCode[inverse.ravel()] & ~_isNone(column)
+        columns[self.target] = np.where(found, codes[inverse.ravel()], columns[self.target])
+
+
+class Translator(object):
+    """Ordered translation rules compiled into column operations.
+
+    outputFields sets the order of the output fields, by default the order the rules first assign them in."""
+
+    def __init__(self, rules, outputFields=None):
+        """constructor."""
+        self.rules = rules
+        self.outputFields = list(outputFields) if outputFields is not None else []
+        self.fields = []
+        for rule in rules:
+            if rule.target not in self.outputFields:
+                if outputFields is not None:
+                    raise ValueError('Rule target {} is not one of the output fields'.format(rule.target))
+                self.outputFields.append(rule.target)
+            for field in rule.fields:
+                if field not in self.fields:
+                    self.fields.append(field)
+        self.fields += [f for f in self.outputFields if f not in self.fields]
+
+    def translate(self, columns):
+        """Get translated output columns from a {field: values} dict of the translator's fields."""
+        translated = dict((f, np.array(columns[f], dtype=object)) for f in self.fields)
+        for rule in self.rules:
+            rule.apply(translated)
+        return dict((f, translated[f]) for f in self.outputFields)
+
+
+def joinedFields(laneFields, translator):
+    """Get the fields iterJoinedRows adds after the coverage fields."""
+    return list(laneFields) + [f for f in translator.outputFields if f not in laneFields]
+
+
+def iterJoinedRows(coverageRows, laneAttributes, laneFields, translator, batchSize=10000, coverIdIndex=1):
+    """Attach bike lane attributes to streaming coverage rows by CoverId and translate them in batches.
+
+    laneAttributes is a {bikeLaneOid: (laneFields values)} dict. Yielded rows are the coverage row followed
+    by the joinedFields values. Rows without a bike lane get None for the lane fields.
+    """
+    extraFields = joinedFields(laneFields, translator)
+    missing = (None,) * len(laneFields)
+    batch = []
+    for coverageRow in coverageRows:
+        batch.append(coverageRow)
+        if len(batch) >= batchSize:
+            for row in _translateBatch(batch, laneAttributes, laneFields, extraFields, translator, missing,
+                                       coverIdIndex):
+                yield row
+            batch = []
+
+    for row in _translateBatch(batch, laneAttributes, laneFields, extraFields, translator, missing, coverIdIndex):
+        yield row
+
+
+def _translateBatch(batch, laneAttributes, laneFields, extraFields, translator, missing, coverIdIndex):
+    """Join and translate one batch of coverage rows."""
+    if len(batch) == 0:
+        return []
+    laneValues = [laneAttributes.get(row[coverIdIndex], missing) for row in batch]
+    columns = dict((f, [None] * len(batch)) for f in extraFields)
+    for i, field in enumerate(laneFields):
+        columns[field] = [values[i] for values in laneValues]
+    for field in translator.fields:
+        if field not in columns:
+            raise ValueError('Translation field {} is not a bike lane field or output field'.format(field))
+
+    columns.update(translator.translate(columns))
+    extraColumns = [columns[f].tolist() if hasattr(columns[f], 'tolist') else columns[f] for f in extraFields]
+    return [list(row) + list(extra) for row, extra in zip(batch, zip(*extraColumns))]
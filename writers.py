@@ -0,0 +1,190 @@
+"""Buffered writers for the LineCoverage table with pluggable output sinks. Does not require arcpy.
+
+A schema is a list of (name, type) or (name, type, length) fields using ArcGIS field types.
+The GDB table sink lives with the other arcpy code in line-coverage.py.
+"""
+import os
+import sqlite3
+
+coverageFields = [('LineId', 'LONG'),
+                  ('CoverId', 'LONG'),
+                  ('JoinDistSum', 'DOUBLE'),
+                  ('Precent', 'FLOAT'),
+                  ('Interx', 'SHORT'),
+                  ('AllUniqueIds', 'SHORT')]
+
+sqliteTypes = {'LONG': 'INTEGER', 'SHORT': 'INTEGER', 'DOUBLE': 'REAL', 'FLOAT': 'REAL', 'TEXT': 'TEXT',
+               'DATE': 'TEXT'}
+# Every GeoPackage must define EPSG:4326 in gpkg_spatial_ref_sys.
+wgs84Definition = ('GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563,'
+                   'AUTHORITY["EPSG","7030"]],AUTHORITY["EPSG","6326"]],PRIMEM["Greenwich",0,AUTHORITY["EPSG","8901"]],'
+                   'UNIT["degree",0.0174532925199433,AUTHORITY["EPSG","9122"]],AUTHORITY["EPSG","4326"]]')
+
+
+class SqliteSink(object):
+    """Write a table to SQLite, or to an attributes table in a GeoPackage when path ends with .gpkg."""
+
+    def __init__(self, path, name):
+        """constructor."""
+        self.path = path
+        self.name = name
+        self.connection = None
+
+    def open(self, schema):
+        """Create the table and start the transaction all batches are written in."""
+        self.fieldNames = [f[0] for f in schema]
+        self.connection = sqlite3.connect(self.path)
+        if self.path.lower().endswith('.gpkg'):
+            self._registerGeoPackageTable()
+        self.connection.execute('DROP TABLE IF EXISTS "{}"'.format(self.name))
+        self.connection.execute('CREATE TABLE "{}" (fid INTEGER PRIMARY KEY AUTOINCREMENT, {})'.format(
+            self.name,
+            ', '.join('"{}" {}'.format(f[0], sqliteTypes[f[1]]) for f in schema)))
+        self.insertSql = 'INSERT INTO "{}" ({}) VALUES ({})'.format(self.name,
+                                                                    ', '.join('"{}"'.format(f) for f in self.fieldNames),
+                                                                    ', '.join('?' * len(self.fieldNames)))
+        self.connection.commit()  # The schema is committed on its own and rows are written in one transaction
+
+    def _registerGeoPackageTable(self):
+        """Create the GeoPackage metadata tables if needed and register the table as attributes."""
+        self.connection.execute('PRAGMA application_id = 1196444487')  # 'GPKG'
+        self.connection.execute('PRAGMA user_version = 10200')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys ('
+                                'srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, organization TEXT NOT NULL, '
+                                'organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, '
+                                'description TEXT)')
+        self.connection.executemany('INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)',
+                                    [('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', None),
+                                     ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', None),
+                                     ('WGS 84 geodetic', 4326, 'EPSG', 4326, wgs84Definition,
+                                      'longitude/latitude coordinates in decimal degrees on the WGS 84 spheroid')])
+        self.connection.execute('CREATE TABLE IF NOT EXISTS gpkg_contents ('
+                                'table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, '
+                                'identifier TEXT UNIQUE, description TEXT DEFAULT \'\', '
+                                'last_change DATETIME NOT NULL DEFAULT (strftime(\'%Y-%m-%dT%H:%M:%fZ\',\'now\')), '
+                                'min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER)')
+        self.connection.execute('INSERT OR REPLACE INTO gpkg_contents (table_name, data_type, identifier) '
+                                'VALUES (?, ?, ?)', (self.name, 'attributes', self.name))
+
+    def write(self, rows):
+        """Insert a batch of rows."""
+        self.connection.executemany(self.insertSql, rows)
+
+    def close(self):
+        """Commit every batch at once."""
+        self.connection.commit()
+        self.connection.close()
+
+    def abort(self):
+        """Roll back written batches and drop the table."""
+        self.connection.rollback()
+        self.connection.execute('DROP TABLE IF EXISTS "{}"'.format(self.name))
+        if self.path.lower().endswith('.gpkg'):
+            self.connection.execute('DELETE FROM gpkg_contents WHERE table_name = ?', (self.name,))
+        self.connection.commit()
+        self.connection.close()
+
+    def result(self):
+        """Get the path of the written database."""
+        return self.path
+
+
+class ParquetSink(object):
+    """Write a table to a Parquet file. Requires pyarrow."""
+
+    parquetTypes = {'LONG': 'int32', 'SHORT': 'int16', 'DOUBLE': 'float64', 'FLOAT': 'float32', 'TEXT': 'string',
+                    'DATE': 'timestamp[ms]'}
+
+    def __init__(self, path):
+        """constructor."""
+        self.path = path
+        self.writer = None
+
+    def open(self, schema):
+        """Start a Parquet file with the schema."""
+        import pyarrow
+        import pyarrow.parquet
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(f[0], pyarrow.type_for_alias(self.parquetTypes[f[1]])) for f in schema])
+        self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema)
+
+    def write(self, rows):
+        """Write a batch of rows as one row group."""
+        columns = list(zip(*rows)) if rows else [[] for f in self.schema]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(
+            [self.pyarrow.array(list(c), type=f.type) for c, f in zip(columns, self.schema)],
+            schema=self.schema))
+
+    def close(self):
+        """Finish the file."""
+        self.writer.close()
+
+    def abort(self):
+        """Close and remove the partly written file."""
+        self.writer.close()
+        os.remove(self.path)
+
+    def result(self):
+        """Get the path of the written file."""
+        return self.path
+
+
+def sinkForPath(path, name):
+    """Get a SQLite, GeoPackage or Parquet sink from a file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.gpkg', '.sqlite', '.db'):
+        return SqliteSink(path, name)
+    if extension == '.parquet':
+        return ParquetSink(path)
+    raise ValueError('No coverage table sink for {}'.format(path))
+
+
+class BufferedWriter(object):
+    """Buffer rows and flush them to a sink in large batches."""
+
+    def __init__(self, sink, schema, batchSize=50000):
+        """constructor."""
+        self.sink = sink
+        self.schema = schema
+        self.batchSize = batchSize
+        self.buffer = []
+        self.rowCount = 0
+        self.sink.open(schema)
+
+    def write(self, row):
+        """Add one row."""
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batchSize:
+            self.flush()
+
+    def writeRows(self, rows):
+        """Add every row from an iterable."""
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """Write buffered rows to the sink."""
+        if self.buffer:
+            self.sink.write(self.buffer)
+            self.rowCount += len(self.buffer)
+            self.buffer = []
+
+    def close(self):
+        """Flush remaining rows and close the sink."""
+        self.flush()
+        self.sink.close()
+        return self.sink.result()
+
+    def abort(self):
+        """Drop buffered rows and remove what the sink has written."""
+        self.buffer = []
+        self.sink.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.close()
+        else:
+            self.abort()